@@ -0,0 +1,169 @@
+"""
+Risk analytics measured from value or price series.
+
+Every function takes one series of shape (days,) or a stack of shape
+(series, days) and measures all of them at once: drawdowns come from a
+running maximum, rolling volatility from cumulative sums of returns and
+squared returns, and VaR/CVaR from one quantile per series. Strategies are
+measured on their time-weighted growth (StrategyResult.unit_growth) rather
+than their values, so money added or withdrawn does not count as a gain or a
+loss.
+"""
+import numpy as np
+
+# Trading days per year, for annualizing volatility and Sharpe ratios
+TRADING_DAYS = 252
+
+# Trading days in the rolling volatility window (about one month)
+VOLATILITY_WINDOW = 21
+
+# Confidence level of the one-day historical VaR and CVaR
+VAR_CONFIDENCE = 0.95
+
+
+def _stack(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values.reshape(-1, values.shape[-1]), values.shape[:-1]
+
+
+def _first_true(mask):
+    """Index of the first True along the last axis, or -1 if there is none"""
+    return np.where(mask.any(axis=-1), mask.argmax(axis=-1), -1)
+
+
+def _rounded(value, digits=4):
+    """Round for the API, with NaN (not measurable) as None"""
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def daily_returns(values):
+    """Simple daily returns, shape (..., days - 1)"""
+    values = np.asarray(values, dtype=np.float64)
+    return values[..., 1:] / values[..., :-1] - 1
+
+
+def drawdown_profile(values):
+    """
+    Measure the maximum drawdown of each series and its recovery.
+
+    The trough is the day furthest below the running peak, and the peak is the
+    day that running peak was set. The series has recovered on the first day
+    after the trough that closes at or above the peak.
+
+    Returns:
+        Dictionary of arrays: 'maxDrawdown' (a positive fraction), and the
+        'peakIndex', 'troughIndex' and 'recoveryIndex' (-1 if not recovered)
+    """
+    stacked, lead_shape = _stack(values)
+    days = np.arange(stacked.shape[-1])
+    running_peak = np.maximum.accumulate(stacked, axis=-1)
+    drawdown = 1 - stacked / running_peak
+    trough = drawdown.argmax(axis=-1)
+    peak_value = np.take_along_axis(running_peak, trough[:, None], axis=-1)
+    peak = _first_true((stacked >= peak_value) & (days <= trough[:, None]))
+    recovery = _first_true((stacked >= peak_value) & (days > trough[:, None]))
+    max_drawdown = drawdown.max(axis=-1)
+    # A series that never fell has nothing to recover from
+    recovery = np.where(max_drawdown > 0, recovery, trough)
+    profile = {
+        'maxDrawdown': max_drawdown,
+        'peakIndex': peak,
+        'troughIndex': trough,
+        'recoveryIndex': recovery
+    }
+    return {name: array.reshape(lead_shape) for name, array in profile.items()}
+
+
+def rolling_volatility(values, window=VOLATILITY_WINDOW, periods=TRADING_DAYS):
+    """
+    Annualized volatility of daily returns over a trailing window.
+
+    Returns:
+        Array of shape (..., days), NaN until the first full window of returns
+    """
+    stacked, lead_shape = _stack(values)
+    returns = daily_returns(stacked)
+    volatility = np.full(stacked.shape, np.nan)
+    if returns.shape[-1] >= window:
+        zero = np.zeros((len(returns), 1))
+        sums = np.concatenate((zero, np.cumsum(returns, axis=-1)), axis=-1)
+        squares = np.concatenate((zero, np.cumsum(returns ** 2, axis=-1)), axis=-1)
+        window_sum = sums[:, window:] - sums[:, :-window]
+        window_squares = squares[:, window:] - squares[:, :-window]
+        variance = (window_squares - window_sum ** 2 / window) / (window - 1)
+        # Cumulative sums can leave tiny negative variances on flat stretches
+        volatility[:, window:] = np.sqrt(np.maximum(variance, 0) * periods)
+    return volatility.reshape(lead_shape + stacked.shape[-1:])
+
+
+def value_at_risk(values, confidence=VAR_CONFIDENCE):
+    """
+    One-day historical VaR and CVaR of each series.
+
+    Returns:
+        Tuple of (VaR, CVaR) arrays: the loss fraction not exceeded on
+        `confidence` of days, and the average loss on the days beyond it
+    """
+    stacked, lead_shape = _stack(values)
+    returns = daily_returns(stacked)
+    if returns.shape[-1] == 0:
+        empty = np.full(lead_shape, np.nan)
+        return empty, empty
+    cutoff = np.quantile(returns, 1 - confidence, axis=-1)
+    tail = returns <= cutoff[:, None]
+    tail_mean = np.where(tail, returns, 0).sum(axis=-1) / tail.sum(axis=-1)
+    return (-cutoff).reshape(lead_shape), (-tail_mean).reshape(lead_shape)
+
+
+def risk_metrics(values, dates=None, risk_free_rate=0.0, window=VOLATILITY_WINDOW, confidence=VAR_CONFIDENCE):
+    """
+    Measure the risk figures of one or more series.
+
+    Args:
+        values: Values or prices, shape (days,) or (series, days)
+        dates: Optional datetime64 axis; adds the peak, trough and recovery dates
+        risk_free_rate: Annual risk-free rate for the Sharpe ratio
+        window: Trading days in the rolling volatility window
+        confidence: Confidence level of VaR and CVaR
+
+    Returns:
+        Dictionary of metrics for a single series, or a list of them for a stack
+    """
+    stacked, lead_shape = _stack(values)
+    if stacked.shape[-1] < 2:
+        raise ValueError("At least two days are needed to measure risk")
+
+    profile = drawdown_profile(stacked)
+    returns = daily_returns(stacked)
+    mean = returns.mean(axis=-1)
+    deviation = returns.std(axis=-1, ddof=1) if returns.shape[-1] > 1 else np.zeros(len(returns))
+    volatility = deviation * np.sqrt(TRADING_DAYS)
+    excess = (mean - risk_free_rate / TRADING_DAYS) * TRADING_DAYS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(volatility > 0, excess / volatility, np.nan)
+    # fmax skips the NaN warm-up days, and stays NaN if there is no full window
+    peak_volatility = np.fmax.reduce(rolling_volatility(stacked, window), axis=-1)
+    var, cvar = value_at_risk(stacked, confidence)
+    date_strings = None if dates is None else np.datetime_as_string(np.asarray(dates), unit='D').tolist()
+
+    metrics = []
+    for i in range(len(stacked)):
+        peak, trough, recovery = (int(profile[name][i]) for name in ('peakIndex', 'troughIndex', 'recoveryIndex'))
+        recovered = recovery >= 0
+        entry = {
+            'maxDrawdown': _rounded(profile['maxDrawdown'][i]),
+            'daysToTrough': trough - peak,
+            'recoveryDays': recovery - trough if recovered else None,
+            'volatility': _rounded(volatility[i]),
+            'peakRollingVolatility': _rounded(peak_volatility[i]),
+            'sharpeRatio': _rounded(sharpe[i]),
+            'valueAtRisk': _rounded(var[i]),
+            'conditionalValueAtRisk': _rounded(cvar[i])
+        }
+        if date_strings is not None:
+            entry['peakDate'] = date_strings[peak]
+            entry['troughDate'] = date_strings[trough]
+            entry['recoveryDate'] = date_strings[recovery] if recovered else None
+        metrics.append(entry)
+    return metrics if lead_shape else metrics[0]
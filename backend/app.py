@@ -1,21 +1,48 @@
 import os
-import pandas as pd
+import threading
 import numpy as np
-import yfinance as yf
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, g
 from flask_cors import CORS
 from datetime import datetime, timedelta
-import openai
 from dotenv import load_dotenv
-import random
-import copy
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from market_engine import generate_market_series, generate_event_impact_series
+from simulation import (
+    PORTFOLIO_STRATEGIES, StrategyResult, cumulative_growth, simulate_index_strategies,
+    strategy_names
+)
+from serialization import (
+    MarketJSONProvider, RESPONSE_FORMATS, wants_stream, ndjson_response, stream_series_rows,
+    stream_strategy_results, response_format, strategy_columns, flatten_strategy_columns, binary_response
+)
+from scenario_cache import ScenarioCache, scenario_key, scenario_seed, portfolio_hash, strategies_hash, with_portfolio
+from price_store import price_source_from_env
+from event_registry import registry
+from holdings import simulate_portfolio_kernel
+from models import (
+    ValidationError, parse_body, parse_event, parse_portfolio, parse_batch, parse_strategies, parse_seed, parse_seed_arg,
+    parse_lod, parse_sweep, parse_monte_carlo
+)
+from compute_pool import ComputePool, PoolBusyError, PoolTimeoutError
+from live_series import RollingMarketSeries
+from narratives import NarrativePipeline, narrative_client_from_env, template_narrative
+from monte_carlo import run_monte_carlo
+from sensitivity import SWEEP_ACTIONS, trade_edges, sweep_portfolio_kernel
+from analytics import risk_metrics
+from seeding import generator, text_seed
+from downsampling import lod_level, build_pyramid, reduce_series
+from instrumentation import (
+    registry as metrics_registry, span, server_timing, RequestProfiler, PROMETHEUS_MIMETYPE,
+    SIZE_BUCKETS, HOLDING_BUCKETS
+)
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Routes and request hooks, registered on the app by create_app
+api = Blueprint('api', __name__)
 
 # Configure OpenAI API key
 openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -25,165 +52,336 @@ if not openai_api_key:
 # MSCI World Index ticker symbol
 MSCI_WORLD_TICKER = "URTH"  # ETF that tracks MSCI World Index
 
+# Background pipeline that writes event narratives off the request path
+narrative_pipeline = NarrativePipeline(
+    narrative_client_from_env(openai_api_key),
+    max_workers=int(os.getenv("NARRATIVE_WORKERS", "4"))
+)
+
+# Seconds an analysis stream waits for its narrative before giving up
+NARRATIVE_STREAM_TIMEOUT = float(os.getenv("NARRATIVE_STREAM_TIMEOUT", "120"))
+
+# Source of market series: generated mock data, or real prices from the local store
+price_source = price_source_from_env(MSCI_WORLD_TICKER)
+
+# Rolling 5-year series served by /api/market-data, extended in place as days pass
+market_series = RollingMarketSeries(price_source)
+
+# Rolling series for explicitly requested ?seed= values, least recently used dropped first
+MAX_SEEDED_MARKET_SERIES = int(os.getenv("MAX_SEEDED_MARKET_SERIES", "32"))
+seeded_market_series = OrderedDict()
+seeded_market_series_lock = threading.Lock()
+
+# Process pool for CPU-heavy simulations; portfolios smaller than
+# COMPUTE_OFFLOAD_CELLS (holdings x days) are simulated inline
+compute_pool = ComputePool(
+    max_workers=int(os.getenv("COMPUTE_PROCESSES", "2")),
+    max_pending=int(os.getenv("COMPUTE_MAX_PENDING", "8")),
+    timeout=float(os.getenv("COMPUTE_TIMEOUT", "30"))
+)
+COMPUTE_OFFLOAD_CELLS = int(os.getenv("COMPUTE_OFFLOAD_CELLS", "20000"))
+
+# Set while the worker is shutting down so readiness checks fail
+draining = False
+
+# Upper bound on Monte Carlo paths per request
+MAX_MONTE_CARLO_PATHS = int(os.getenv("MAX_MONTE_CARLO_PATHS", "20000"))
+
+# Upper bounds on a sensitivity sweep: severities (each generates a scenario), values per
+# other axis, and actions x severities x offsets x cash flows x holdings evaluated
+MAX_SWEEP_SEVERITIES = int(os.getenv("MAX_SWEEP_SEVERITIES", "20"))
+MAX_SWEEP_AXIS_LENGTH = int(os.getenv("MAX_SWEEP_AXIS_LENGTH", "100"))
+MAX_SWEEP_CELLS = int(os.getenv("MAX_SWEEP_CELLS", "2000000"))
+
+# Threads that simulate the items of batch requests, and the most items one batch may hold
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BATCH_WORKERS", "4")),
+    thread_name_prefix='batch'
+)
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "200"))
+
+# Upper bound on holdings in one custom portfolio
+MAX_PORTFOLIO_HOLDINGS = int(os.getenv("MAX_PORTFOLIO_HOLDINGS", "1000"))
+
+# Upper bounds on strategies compared per request, and on holdings x strategies x days simulated
+MAX_STRATEGIES = int(os.getenv("MAX_STRATEGIES", "200"))
+MAX_STRATEGY_CELLS = int(os.getenv("MAX_STRATEGY_CELLS", "20000000"))
+
+# Cache of generated event series and simulation results, keyed by scenario. With
+# SCENARIO_CACHE_DIR set, entries are shared by every worker through memory-mapped files
+scenario_cache = ScenarioCache(
+    max_entries=int(os.getenv("SCENARIO_CACHE_SIZE", "128")),
+    ttl_seconds=float(os.getenv("SCENARIO_CACHE_TTL", "3600")),
+    cache_dir=os.getenv("SCENARIO_CACHE_DIR") or None,
+    max_disk_bytes=int(os.getenv("SCENARIO_CACHE_MAX_BYTES", str(1 << 30)))
+)
+
+# Request metrics served at /metrics; they are kept per web worker process
+request_seconds = metrics_registry.histogram(
+    'request_seconds', 'Request latency until the response starts', ('endpoint', 'method', 'status')
+)
+response_bytes = metrics_registry.histogram(
+    'response_bytes', 'Size of non-streamed response bodies', ('endpoint',), SIZE_BUCKETS
+)
+portfolio_holdings = metrics_registry.histogram(
+    'portfolio_holdings', 'Holdings per simulated custom portfolio', buckets=HOLDING_BUCKETS
+)
+metrics_registry.callback('scenario_cache_hits_total', 'Scenario cache hits', lambda: scenario_cache.hits, 'counter')
+metrics_registry.callback('scenario_cache_misses_total', 'Scenario cache misses', lambda: scenario_cache.misses, 'counter')
+metrics_registry.callback(
+    'scenario_cache_disk_hits_total', 'Scenario cache hits attached from the shared store', lambda: scenario_cache.disk_hits, 'counter'
+)
+if scenario_cache.store:
+    metrics_registry.callback(
+        'scenario_store_bytes', 'Bytes held by the shared scenario store on this node',
+        lambda: scenario_cache.store.stats()['bytes']
+    )
+metrics_registry.callback('scenario_cache_entries', 'Scenarios held in memory', lambda: len(scenario_cache))
+
+# Allow ?profile=1 to attach a cProfile summary to responses (off unless enabled)
+ALLOW_PROFILING = os.getenv("ALLOW_PROFILING", "0") == "1"
+
 # Function to generate mock market data
-def generate_mock_market_data(start_date, end_date):
+def generate_mock_market_data(start_date, end_date, seed):
     """Generate mock market data for a specified time period"""
-    # Calculate number of days between start and end dates
-    days = (end_date - start_date).days + 1
+    return generate_market_series(start_date, end_date, generator(seed)).to_records()
+
+# Function to generate market data with a specific event impact
+def generate_event_impact_data(event, start_date, end_date, impact_date, severity, seed):
+    """Generate mock market data with an event impact"""
+    series, recovery_days, _ = generate_event_impact_series(start_date, end_date, impact_date, severity, generator(seed))
+    return series.to_records(), recovery_days
+
+def rolling_market_series(seed=None):
+    """Return the rolling market series for a seed (the shared default series if None)"""
+    if seed is None or seed == market_series.seed:
+        return market_series
+    with seeded_market_series_lock:
+        series = seeded_market_series.get(seed)
+        if series is None:
+            series = seeded_market_series[seed] = RollingMarketSeries(price_source, seed=seed)
+            while len(seeded_market_series) > MAX_SEEDED_MARKET_SERIES:
+                seeded_market_series.popitem(last=False)
+        seeded_market_series.move_to_end(seed)
+        return series
+
+def match_event(event):
+    """Match an event description against the registry, falling back to a generic event"""
+    with span('match_event'):
+        matched_event = registry.match(event)
     
-    # Generate a sequence of dates
-    dates = [start_date + timedelta(days=i) for i in range(days)]
+    # If no specific event matched, use a generic one
+    if not matched_event:
+        # Default to a moderately severe event at a random date in the past 10 years,
+        # drawn from the description so the same text always gets the same event
+        rng = generator(text_seed('generic-event', event))
+        years_back = int(rng.integers(1, 11))
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        matched_event = {
+            'name': f'Market Event: {event}',
+            'date': today - timedelta(days=365 * years_back),
+            'severity': float(rng.uniform(0.10, 0.25))
+        }
+    
+    return matched_event
+
+def event_window(event_date):
+    """Return the (start_date, end_date) window analysed around an event"""
+    start_date = event_date - timedelta(days=180)  # 6 months before
+    end_date = min(event_date + timedelta(days=730), datetime.now())  # Up to 2 years after or today
+    return start_date, end_date
+
+def get_event_scenario(matched_event, start_date, end_date, seed=None):
+    """
+    Get the event impact series for a scenario, generating it on a cache miss.
     
-    # Starting price
-    base_price = 100.0
+    The series is seeded deterministically from the scenario key (or the
+    request's explicit seed), so every endpoint sees the same data for the
+    same event and window. scenario_seed(key) is the seed to echo to clients.
     
-    # Generate mock prices
-    formatted_data = []
-    current_price = base_price
+    Returns:
+        Tuple of (key, frozen MarketSeries, recovery_days, impact_idx)
+    """
+    key = scenario_key(
+        matched_event['name'], start_date, end_date, matched_event['severity'], seed, source=price_source.name
+    )
     
-    for i, date in enumerate(dates):
-        # Skip weekends
-        if date.weekday() >= 5:  # Saturday=5, Sunday=6
-            continue
-            
-        # Random daily change between -2% and 2%
-        daily_change = random.uniform(-0.02, 0.02)
-        
-        # Add some trends and volatility
-        if i > 0 and i % 20 == 0:
-            # Create a small trend shift every 20 days
-            trend_shift = random.uniform(-0.05, 0.05)
-            current_price *= (1 + trend_shift)
-        
-        # Apply daily change
-        current_price *= (1 + daily_change)
-        
-        # Calculate other price points based on the close price
-        open_price = current_price * random.uniform(0.99, 1.01)
-        high_price = max(open_price, current_price) * random.uniform(1.001, 1.01)
-        low_price = min(open_price, current_price) * random.uniform(0.99, 0.999)
-        volume = int(random.uniform(100000, 1000000))
-        
-        # Add data point
-        formatted_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'close': round(current_price, 2),
-            'open': round(open_price, 2),
-            'high': round(high_price, 2),
-            'low': round(low_price, 2),
-            'volume': volume
-        })
+    def generate():
+        with span('generate'):
+            series, recovery_days, impact_idx = price_source.event_series(
+                start_date, 
+                end_date, 
+                matched_event['date'], 
+                matched_event['severity'],
+                generator(scenario_seed(key))
+            )
+        return series.freeze(), recovery_days, impact_idx
     
-    return formatted_data
+    series, recovery_days, impact_idx = scenario_cache.get_or_create(key, generate)
+    return key, series.freeze(), recovery_days, impact_idx
 
-# Function to generate market data with a specific event impact
-def generate_event_impact_data(event, start_date, end_date, impact_date, severity):
-    """Generate mock market data with an event impact"""
-    # Get base data
-    data = generate_mock_market_data(start_date, end_date)
-    
-    # Find the index closest to the impact date
-    impact_date_str = impact_date.strftime('%Y-%m-%d')
-    impact_idx = 0
-    
-    for i, item in enumerate(data):
-        if item['date'] >= impact_date_str:
-            impact_idx = i
-            break
-    
-    # Apply impact effect - a sudden drop followed by gradual recovery
-    impact_factor = max(0.05, min(0.40, severity))  # Limit between 5% and 40%
-    recovery_days = int(severity * 100)  # More severe = longer recovery
-    
-    # Apply market crash
-    for i in range(impact_idx, min(impact_idx + 10, len(data))):
-        drop_factor = impact_factor * (10 - (i - impact_idx)) / 10
-        data[i]['close'] *= (1 - drop_factor)
-        data[i]['open'] *= (1 - drop_factor)
-        data[i]['high'] *= (1 - drop_factor)
-        data[i]['low'] *= (1 - drop_factor)
-        data[i]['volume'] = int(data[i]['volume'] * (1 + drop_factor * 5))  # Higher volume during crash
-    
-    # Apply recovery
-    pre_crash_price = data[impact_idx - 1]['close'] if impact_idx > 0 else data[0]['close']
-    post_crash_price = data[min(impact_idx + 9, len(data) - 1)]['close']
-    price_gap = pre_crash_price - post_crash_price
-    
-    for i in range(impact_idx + 10, min(impact_idx + 10 + recovery_days, len(data))):
-        recovery_progress = (i - (impact_idx + 10)) / recovery_days
-        recovery_factor = min(1.0, recovery_progress * 1.5)  # Can accelerate recovery a bit
-        
-        recovery_amount = price_gap * recovery_factor
-        data[i]['close'] = post_crash_price + recovery_amount
-        data[i]['open'] = data[i]['close'] * random.uniform(0.99, 1.01)
-        data[i]['high'] = data[i]['close'] * random.uniform(1.0, 1.02)
-        data[i]['low'] = data[i]['close'] * random.uniform(0.98, 1.0)
-    
-    # Round all the price values
-    for item in data:
-        item['close'] = round(item['close'], 2)
-        item['open'] = round(item['open'], 2)
-        item['high'] = round(item['high'], 2)
-        item['low'] = round(item['low'], 2)
-    
-    return data, recovery_days
-
-def simulate_investment_strategy(event_data, impact_idx, strategy):
+def invalid_format_response():
+    """Return the 400 response for an unsupported ?format= value"""
+    return jsonify({
+        'status': 'error',
+        'message': f"Unsupported format, expected one of: {', '.join(RESPONSE_FORMATS)}"
+    }), 400
+
+def not_modified_response(etag):
+    """Return an empty 304 response carrying the current entity tag"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+def scenario_lod(key, series, points, method):
     """
-    Simulate the performance of different investment strategies during a market event.
-    
-    Args:
-        event_data: List of market data points with the event impact
-        impact_idx: Index of the event impact start
-        strategy: String indicating the strategy ('withdraw', 'add', or 'hold')
+    Return the requested detail level of a scenario from its cached pyramid.
     
     Returns:
-        Modified data showing portfolio value over time
+        Tuple of (reduce_series result, or None when the series is sent whole; 'lod' response metadata or None)
     """
-    # Create a deep copy of the data to avoid modifying the original
-    data = copy.deepcopy(event_data)
-    
-    # Calculate the event midpoint (approximately when the market has dropped halfway)
-    mid_event_idx = impact_idx + 5  # Assuming event impact occurs over 10 days
-    
-    # Initialize portfolio with 100 units and track value
-    initial_units = 100
-    units = initial_units
-    
-    # Calculate portfolio value for each day and add to data
-    for i in range(len(data)):
-        if i == mid_event_idx:
-            # Apply the selected strategy at the mid-point of the event
-            if strategy == 'withdraw':
-                # Withdraw 20% (sell 20% of holdings)
-                sell_units = units * 0.2
-                units -= sell_units
-            elif strategy == 'add':
-                # Add 20% (buy 20% more units at current price)
-                current_price = data[i]['close']
-                add_units = units * 0.2
-                units += add_units
-            # For 'hold' strategy, do nothing
-        
-        # Calculate portfolio value based on current units and price
-        data[i]['portfolio_value'] = units * data[i]['close']
-    
-    return data
-
-@app.route('/api/market-data', methods=['GET'])
+    level = lod_level(points, len(series)) if points else None
+    if level is None:
+        return None, None
+    pyramid = scenario_cache.get_or_create(
+        with_portfolio(key, f'lod-{method}'), lambda: build_pyramid(series, method)
+    )
+    reduced = pyramid[level] if level in pyramid else reduce_series(series, method, level)
+    return reduced, {'method': method, 'points': level, 'sourcePoints': len(series)}
+
+def downsample_series(series, method, reduced):
+    """Apply a reduce_series result to the series it was computed from"""
+    return series.take(reduced) if method == 'lttb' else reduced
+
+def downsample_strategy_results(strategies_data, individual_stocks, indices):
+    """Keep the given rows of every strategy and holding result, sharing one reduced base series"""
+    base_series = next(iter(strategies_data.values())).series.take(indices)
+    strategies_data = {strategy: result.take(indices, base_series) for strategy, result in strategies_data.items()}
+    individual_stocks = {
+        stock_id: {
+            **stock,
+            'strategies': {strategy: result.take(indices, base_series) for strategy, result in stock['strategies'].items()}
+        }
+        for stock_id, stock in individual_stocks.items()
+    }
+    return strategies_data, individual_stocks
+
+def prewarm_scenarios():
+    """Generate and cache the series for every registered event"""
+    for event_info in registry:
+        start_date, end_date = event_window(event_info['date'])
+        get_event_scenario(event_info, start_date, end_date)
+    print(f"Prewarmed {len(registry)} event scenarios")
+
+@api.before_app_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.spans = []
+    if ALLOW_PROFILING and request.args.get('profile', '').lower() in ('1', 'true', 'yes'):
+        profiler = RequestProfiler()
+        g.profiler = profiler if profiler.start() else None
+        g.profile_requested = True
+
+@api.after_app_request
+def record_request_metrics(response):
+    """Record request latency and payload size, and attach the timing spans and any profile"""
+    if g.get('profile_requested'):
+        profiler = g.pop('profiler', None)
+        summary = profiler.stop() if profiler else {'status': 'busy', 'message': 'Another request is being profiled'}
+        # Only whole JSON object bodies can carry the profile; streams and binary payloads go without
+        if response.is_json and not response.is_streamed:
+            body = response.get_json()
+            if isinstance(body, dict):
+                body['profile'] = summary
+                response.set_data(current_app.json.dumps(body))
+    
+    elapsed = time.perf_counter() - g.request_started
+    # Label by view name without the blueprint prefix
+    endpoint = request.endpoint.rpartition('.')[2] if request.endpoint else 'unmatched'
+    request_seconds.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    if not response.is_streamed:
+        response_bytes.observe(response.content_length or 0, endpoint=endpoint)
+    response.headers['Server-Timing'] = ', '.join(
+        filter(None, [server_timing(g.get('spans', [])), f'total;dur={elapsed * 1000:.2f}'])
+    )
+    return response
+
+@api.teardown_app_request
+def stop_request_profiler(exc=None):
+    # Release the profiler if the request failed before after_request ran
+    profiler = g.pop('profiler', None)
+    if profiler:
+        profiler.stop()
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(metrics_registry.render(), content_type=PROMETHEUS_MIMETYPE)
+
+@api.route('/api/market-data', methods=['GET'])
 def get_market_data():
     """Fetch MSCI World Index data for the default time period (5 years)"""
     try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=5*365)  # 5 years of data
+        fmt = response_format(request)
+        if fmt is None:
+            return invalid_format_response()
+        try:
+            points, method = parse_lod(request.args)
+            market = rolling_market_series(parse_seed_arg(request.args))
+        except ValidationError as e:
+            return validation_error_response(e)
         
-        # Generate mock data instead of fetching from Yahoo Finance
-        formatted_data = generate_mock_market_data(start_date, end_date)
+        since = request.args.get('since')
+        if since:
+            try:
+                since = datetime.strptime(since, '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'since must be a date in YYYY-MM-DD format'
+                }), 400
         
-        return jsonify({
-            'status': 'success',
-            'data': formatted_data
-        })
+        # Extend the persistent 5-year series up to today (a no-op after the first call each day)
+        market.refresh()
+        etag = market.etag()
+        if points:
+            # Each detail level is its own representation
+            etag = f'{etag}-{method}{points}'
+        
+        # Nothing changed since the client's copy: no body needed
+        if not since and etag in request.if_none_match:
+            return not_modified_response(etag)
+        
+        series = market.since(since or None)
+        if since and len(series) == 0:
+            return not_modified_response(etag)
+        
+        meta = {'status': 'success', 'seed': market.seed, 'cursor': market.cursor(), 'incremental': bool(since)}
+        
+        # The rolling series changes daily, so its levels are computed per request
+        level = lod_level(points, len(series)) if points else None
+        if level is not None:
+            meta['lod'] = {'method': method, 'points': level, 'sourcePoints': len(series)}
+            series = downsample_series(series, method, reduce_series(series, method, level))
+        
+        if wants_stream(request):
+            response = ndjson_response(stream_series_rows(meta, series))
+        elif fmt == 'binary':
+            response = binary_response(series.columns(), meta)
+        elif fmt == 'columnar':
+            response = jsonify({
+                **meta,
+                'format': 'columnar',
+                'data': series.columns()
+            })
+        else:
+            response = jsonify({
+                **meta,
+                'data': series
+            })
+        
+        response.set_etag(etag)
+        return response
     
     except Exception as e:
         return jsonify({
@@ -191,87 +389,75 @@ def get_market_data():
             'message': str(e)
         }), 500
 
-@app.route('/api/analyze-event', methods=['POST'])
+@api.route('/api/analyze-event', methods=['POST'])
 def analyze_event():
     """Analyze a global event's impact on the market and adjust the timeframe"""
     try:
         # Get event details from request
-        data = request.json
-        event = data.get('event')
-        
-        if not event:
-            return jsonify({
-                'status': 'error',
-                'message': 'Event description is required'
-            }), 400
-        
-        # Mock events with predefined time periods and severity
-        events_map = {
-            'covid': {'name': 'COVID-19 Pandemic', 'date': datetime(2020, 2, 15), 'severity': 0.35},
-            'financial crisis': {'name': '2008 Financial Crisis', 'date': datetime(2008, 9, 15), 'severity': 0.40},
-            'dot com': {'name': 'Dot-com Bubble Burst', 'date': datetime(2000, 3, 10), 'severity': 0.30},
-            'brexit': {'name': 'Brexit Referendum', 'date': datetime(2016, 6, 23), 'severity': 0.15},
-            'ukraine': {'name': 'Russia-Ukraine Conflict', 'date': datetime(2022, 2, 24), 'severity': 0.12},
-            'inflation': {'name': 'Inflation Spike', 'date': datetime(2021, 10, 1), 'severity': 0.10}
-        }
+        try:
+            data = parse_body(request.get_json(silent=True))
+            event = parse_event(data)
+            seed = parse_seed(data)
+            points, method = parse_lod(request.args)
+        except ValidationError as e:
+            return validation_error_response(e)
         
-        # Determine which event was mentioned (simple keyword matching)
-        matched_event = None
-        event_lower = event.lower()
-        
-        for key, event_info in events_map.items():
-            if key in event_lower:
-                matched_event = event_info
-                break
-        
-        # If no specific event matched, use a generic one
-        if not matched_event:
-            # Default to a moderately severe event at a random date in the past 10 years
-            years_back = random.randint(1, 10)
-            random_date = datetime.now() - timedelta(days=365 * years_back)
-            matched_event = {
-                'name': f'Market Event: {event}',
-                'date': random_date,
-                'severity': random.uniform(0.10, 0.25)
-            }
+        # Determine which event was mentioned
+        matched_event = match_event(event)
         
         # Define the time period
         event_date = matched_event['date']
-        start_date = event_date - timedelta(days=180)  # 6 months before
-        end_date = min(event_date + timedelta(days=730), datetime.now())  # Up to 2 years after or today
+        start_date, end_date = event_window(event_date)
         
         # Generate mock data with the event impact
-        formatted_data, recovery_days = generate_event_impact_data(
-            event, 
-            start_date, 
-            end_date, 
-            event_date, 
-            matched_event['severity']
+        key, series, _, _ = get_event_scenario(matched_event, start_date, end_date, seed)
+        
+        # Measure the decline and recovery from the series rather than the event parameters
+        with span('analytics'):
+            market_risk = risk_metrics(series.close, series.dates)
+        recovered = market_risk['recoveryDays'] is not None
+        # Unrecovered series count the days from the trough to the end of the window
+        recovery_days = market_risk['recoveryDays'] if recovered else (
+            len(series) - 1 - series.date_strings().index(market_risk['troughDate'])
         )
         
-        # Create a mock analysis
-        recovery_time = f"{recovery_days} trading days (approximately {round(recovery_days/20, 1)} months)"
-        percent_decline = f"{round(matched_event['severity'] * 100, 1)}%"
+        # Start the narrative in the background and answer with the templated analysis for now
+        stats = {
+            'eventName': matched_event['name'],
+            'eventDate': event_date,
+            'startDate': start_date.strftime('%Y-%m-%d'),
+            'endDate': end_date.strftime('%Y-%m-%d'),
+            'percentDecline': market_risk['maxDrawdown'],
+            'recoveryDays': recovery_days
+        }
+        job = analyze_market_impact(stats)
         
+        if recovered:
+            recovery_time = (f"{recovery_days} trading days (approximately {round(recovery_days/20, 1)} months), "
+                             f"back to the pre-decline level on {market_risk['recoveryDate']}")
+        else:
+            recovery_time = f"Not recovered by {end_date.strftime('%Y-%m-%d')} ({recovery_days} trading days after the low)"
         analysis = {
-            'summary': f"The {matched_event['name']} had a significant impact on global markets. "
-                      f"Starting around {event_date.strftime('%B %Y')}, markets experienced a sharp decline "
-                      f"of approximately {percent_decline} over a period of several days to weeks. "
-                      f"This was driven by investor uncertainty, risk aversion, and liquidity concerns. "
-                      f"The markets initially showed high volatility with larger than average trading volumes. "
-                      f"Recovery took place gradually over the following months, with a complete return to "
-                      f"pre-event levels taking approximately {recovery_days/20:.1f} months. "
-                      f"This event demonstrated how external shocks can rapidly impact global financial markets "
-                      f"and the resilience of markets to recover over time.",
+            **template_narrative(stats),
             'recovery_time': recovery_time,
-            'percent_decline': percent_decline,
-            'key_insight': f"The market took approximately {recovery_days/20:.1f} months to fully recover from this event, demonstrating the resilience of financial markets to external shocks over medium-term horizons."
+            'percent_decline': f"{round(market_risk['maxDrawdown'] * 100, 1)}%",
+            'risk': market_risk
         }
         
+        # Measured on every day above; only the chart data is downsampled
+        reduced, lod = scenario_lod(key, series, points, method)
+        
         return jsonify({
             'status': 'success',
-            'data': formatted_data,
+            'seed': scenario_seed(key),
+            'data': series if reduced is None else downsample_series(series, method, reduced),
+            'lod': lod,
             'analysis': analysis,
+            'analysisJob': {
+                **job.to_dict(),
+                'url': f'/api/analysis/{job.id}',
+                'streamUrl': f'/api/analysis/{job.id}/stream'
+            },
             'timeFrame': {
                 'startDate': start_date.strftime('%Y-%m-%d'),
                 'endDate': end_date.strftime('%Y-%m-%d')
@@ -284,317 +470,698 @@ def analyze_event():
             'message': str(e)
         }), 500
 
-@app.route('/api/simulate-strategies', methods=['POST'])
+def validation_error_response(error):
+    return jsonify({
+        'status': 'error',
+        'message': str(error)
+    }), 400
+
+def check_finite_results(strategies_data):
+    """
+    Raise ValidationError if a strategy's values overflowed.
+
+    Portfolio values are sums over the holdings, so a non-finite holding
+    value always shows up in them. JSON cannot carry Infinity or NaN.
+    """
+    for name, result in strategies_data.items():
+        if not np.isfinite(result.values).all():
+            raise ValidationError(f'Strategy {name} produced values too large to represent')
+    return strategies_data
+
+def default_strategy_results(base_series, impact_idx, specs=None):
+    """Simulate the default 100-unit index portfolio under every strategy (or the requested ones)"""
+    with span('simulate_strategies'):
+        return check_finite_results(
+            simulate_index_strategies(base_series, impact_idx, specs or ('withdraw', 'add', 'hold'))
+        )
+
+def check_strategy_cells(days, holdings, specs):
+    """Raise ValidationError if simulating the requested strategies would be too large"""
+    if specs and days * max(holdings, 1) * len(specs) > MAX_STRATEGY_CELLS:
+        raise ValidationError(
+            f'Too much to simulate at once: holdings x strategies x days must be at most {MAX_STRATEGY_CELLS}'
+        )
+
+def portfolio_strategy_results(key, base_series, impact_idx, portfolio, specs=None):
+    """
+    Simulate a custom portfolio for a scenario, cached by scenario and portfolio.
+    
+    Returns:
+        Tuple of (StrategyResult per strategy, per-stock results keyed by investment id)
+    """
+    holdings_hash = portfolio_hash(portfolio.investments)
+    portfolio_key = with_portfolio(key, f'{holdings_hash}-{strategies_hash(specs)}' if specs else holdings_hash)
+    with span('simulate_strategies'):
+        strategies_data, individual_stocks = scenario_cache.get_or_create(
+            portfolio_key,
+            lambda: simulate_custom_portfolio(
+                base_series, impact_idx, portfolio, [scenario_seed(key), int(holdings_hash, 16)],
+                specs or PORTFOLIO_STRATEGIES
+            )
+        )
+    return check_finite_results(strategies_data), individual_stocks
+
+def strategy_summary(strategies_data, matched_event):
+    """Summarize strategy results: initial and final values, percent changes, risk figures and the best strategy"""
+    # Get the first strategy's initial value
+    first_strategy = next(iter(strategies_data.values()))
+    initial_value = first_strategy.initial_value
+    
+    final_values = {
+        strategy: result.final_value
+        for strategy, result in strategies_data.items()
+    }
+    
+    # Calculate percentage changes
+    percent_changes = {
+        strategy: round(((value - initial_value) / initial_value) * 100, 2)
+        for strategy, value in final_values.items()
+    }
+    
+    # Determine best strategy based on final value
+    best_strategy = max(final_values, key=final_values.get)
+    
+    # Measure every strategy and the market itself in one pass. Strategies are
+    # measured on their time-weighted growth, so cash added or withdrawn is not
+    # counted as a gain or a loss
+    base_series = first_strategy.series
+    with span('analytics'):
+        measured = risk_metrics(
+            np.stack([base_series.close] + [result.unit_growth for result in strategies_data.values()]),
+            base_series.dates
+        )
+    
+    return {
+        'initialValue': round(initial_value, 2),
+        'finalValues': {k: round(v, 2) for k, v in final_values.items()},
+        'percentChanges': percent_changes,
+        'bestStrategy': best_strategy,
+        'marketRisk': measured[0],
+        'riskMetrics': dict(zip(strategies_data, measured[1:])),
+        'eventName': matched_event['name'],
+        'eventDate': matched_event['date'].strftime('%Y-%m-%d'),
+        'eventSeverity': f"{round(matched_event['severity'] * 100, 1)}%"
+    }
+
+def event_time_frame(event_date, start_date, end_date):
+    return {
+        'startDate': start_date.strftime('%Y-%m-%d'),
+        'endDate': end_date.strftime('%Y-%m-%d'),
+        'eventDate': event_date.strftime('%Y-%m-%d')
+    }
+
+@api.route('/api/simulate-strategies', methods=['POST'])
 def simulate_strategies():
     """Simulate different investment strategies during a market event"""
     try:
-        # Get event details from request
-        data = request.json
-        event = data.get('event')
-        user_investments = data.get('investments', [])  # Get user's custom investments
-        selected_investments = data.get('selectedInvestments', [])  # Get selected investment IDs
+        fmt = response_format(request)
+        if fmt is None:
+            return invalid_format_response()
         
-        if not event:
-            return jsonify({
-                'status': 'error',
-                'message': 'Event description is required'
-            }), 400
-        
-        # Mock events with predefined time periods and severity (same as in analyze_event)
-        events_map = {
-            'covid': {'name': 'COVID-19 Pandemic', 'date': datetime(2020, 2, 15), 'severity': 0.35},
-            'financial crisis': {'name': '2008 Financial Crisis', 'date': datetime(2008, 9, 15), 'severity': 0.40},
-            'dot com': {'name': 'Dot-com Bubble Burst', 'date': datetime(2000, 3, 10), 'severity': 0.30},
-            'brexit': {'name': 'Brexit Referendum', 'date': datetime(2016, 6, 23), 'severity': 0.15},
-            'ukraine': {'name': 'Russia-Ukraine Conflict', 'date': datetime(2022, 2, 24), 'severity': 0.12},
-            'inflation': {'name': 'Inflation Spike', 'date': datetime(2021, 10, 1), 'severity': 0.10}
-        }
+        # Get event details from request and validate the selected investments once
+        try:
+            data = parse_body(request.get_json(silent=True))
+            event = parse_event(data)
+            portfolio = parse_portfolio(data, MAX_PORTFOLIO_HOLDINGS)
+            specs = parse_strategies(data, MAX_STRATEGIES)
+            seed = parse_seed(data)
+            # Strategy values are not candles, so only LTTB applies
+            points, _ = parse_lod(request.args, ('lttb',))
+        except ValidationError as e:
+            return validation_error_response(e)
         
-        # Determine which event was mentioned (simple keyword matching)
-        matched_event = None
-        event_lower = event.lower()
-        
-        for key, event_info in events_map.items():
-            if key in event_lower:
-                matched_event = event_info
-                break
-        
-        # If no specific event matched, use a generic one
-        if not matched_event:
-            # Default to a moderately severe event at a random date in the past 10 years
-            years_back = random.randint(1, 10)
-            random_date = datetime.now() - timedelta(days=365 * years_back)
-            matched_event = {
-                'name': f'Market Event: {event}',
-                'date': random_date,
-                'severity': random.uniform(0.10, 0.25)
-            }
+        # Determine which event was mentioned
+        matched_event = match_event(event)
         
         # Define the time period
         event_date = matched_event['date']
-        start_date = event_date - timedelta(days=180)  # 6 months before
-        end_date = min(event_date + timedelta(days=730), datetime.now())  # Up to 2 years after or today
+        start_date, end_date = event_window(event_date)
         
         # Generate base event impact data
-        base_data, recovery_days = generate_event_impact_data(
-            event, 
-            start_date, 
-            end_date, 
-            event_date, 
-            matched_event['severity']
-        )
-        
-        # Find the index closest to the impact date
-        impact_date_str = event_date.strftime('%Y-%m-%d')
-        impact_idx = 0
-        
-        for i, item in enumerate(base_data):
-            if item['date'] >= impact_date_str:
-                impact_idx = i
-                break
+        key, base_series, recovery_days, impact_idx = get_event_scenario(matched_event, start_date, end_date, seed)
+        try:
+            check_strategy_cells(len(base_series), len(portfolio), specs)
+        except ValidationError as e:
+            return validation_error_response(e)
         
         # Default portfolio if no investments provided
         individual_stocks = {}
-        if not user_investments or not selected_investments:
-            # Simulate default strategies
-            withdraw_data = simulate_investment_strategy(base_data, impact_idx, 'withdraw')
-            add_data = simulate_investment_strategy(base_data, impact_idx, 'add')
-            hold_data = simulate_investment_strategy(base_data, impact_idx, 'hold')
-            
-            strategies_data = {
-                'withdraw': withdraw_data,
-                'add': add_data, 
-                'hold': hold_data
-            }
-        else:
-            # Filter selected investments
-            selected_investments_data = [inv for inv in user_investments if inv['id'] in selected_investments]
-            
-            if not selected_investments_data:
-                # If no investments are selected, use default simulation
-                withdraw_data = simulate_investment_strategy(base_data, impact_idx, 'withdraw')
-                add_data = simulate_investment_strategy(base_data, impact_idx, 'add')
-                hold_data = simulate_investment_strategy(base_data, impact_idx, 'hold')
-                
-                strategies_data = {
-                    'withdraw': withdraw_data,
-                    'add': add_data, 
-                    'hold': hold_data
-                }
+        try:
+            if not portfolio:
+                # Simulate default strategies
+                strategies_data = default_strategy_results(base_series, impact_idx, specs)
             else:
-                # Calculate total investment amount from selected investments
-                total_investment = sum(float(inv['amount']) for inv in selected_investments_data)
-                
-                if total_investment <= 0:
-                    return jsonify({
-                        'status': 'error',
-                        'message': 'Total investment amount must be greater than zero'
-                    }), 400
-                
                 # Simulate strategies with user's custom portfolio
-                strategies_data, individual_stocks = simulate_custom_portfolio(base_data, impact_idx, selected_investments_data, total_investment)
+                strategies_data, individual_stocks = portfolio_strategy_results(
+                    key, base_series, impact_idx, portfolio, specs
+                )
+        except ValidationError as e:
+            return validation_error_response(e)
         
         # Create summary of results
-        end_idx = len(base_data) - 1
+        results_summary = strategy_summary(strategies_data, matched_event)
+        results_summary['seed'] = scenario_seed(key)
+        results_summary['userInvestments'] = data.get('investments', [])
+        results_summary['selectedInvestments'] = data.get('selectedInvestments', [])
         
-        # Get the first strategy's initial value
-        first_strategy = next(iter(strategies_data.values()))
-        initial_value = first_strategy[0]['portfolio_value']
+        time_frame = event_time_frame(event_date, start_date, end_date)
         
-        final_values = {
-            strategy: data[end_idx]['portfolio_value']
-            for strategy, data in strategies_data.items()
-        }
+        # The summary covers every day; the series sent for charting may be downsampled
+        indices, lod = scenario_lod(key, base_series, points, 'lttb')
+        if indices is not None:
+            strategies_data, individual_stocks = downsample_strategy_results(strategies_data, individual_stocks, indices)
         
-        # Calculate percentage changes
-        percent_changes = {
-            strategy: round(((value - initial_value) / initial_value) * 100, 2)
-            for strategy, value in final_values.items()
-        }
+        if wants_stream(request):
+            # Send the summary first, then one line per strategy series
+            meta = {'status': 'success', 'summary': results_summary, 'timeFrame': time_frame, 'lod': lod}
+            return ndjson_response(stream_strategy_results(meta, strategies_data, individual_stocks))
         
-        # Determine best strategy based on final value
-        best_strategy = max(final_values, key=final_values.get)
+        if fmt == 'binary':
+            columns, stocks = flatten_strategy_columns(strategy_columns(strategies_data, individual_stocks))
+            meta = {'summary': results_summary, 'timeFrame': time_frame, 'lod': lod, 'individualStocks': stocks}
+            return binary_response(columns, meta)
         
-        results_summary = {
-            'initialValue': round(initial_value, 2),
-            'finalValues': {k: round(v, 2) for k, v in final_values.items()},
-            'percentChanges': percent_changes,
-            'bestStrategy': best_strategy,
-            'eventName': matched_event['name'],
-            'eventDate': event_date.strftime('%Y-%m-%d'),
-            'eventSeverity': f"{round(matched_event['severity'] * 100, 1)}%",
-            'userInvestments': user_investments,
-            'selectedInvestments': selected_investments
-        }
+        if fmt == 'columnar':
+            return jsonify({
+                'status': 'success',
+                'format': 'columnar',
+                **strategy_columns(strategies_data, individual_stocks),
+                'summary': results_summary,
+                'timeFrame': time_frame,
+                'lod': lod
+            })
         
         return jsonify({
             'status': 'success',
             'strategies': strategies_data,
             'individualStocks': individual_stocks,
             'summary': results_summary,
-            'timeFrame': {
-                'startDate': start_date.strftime('%Y-%m-%d'),
-                'endDate': end_date.strftime('%Y-%m-%d'),
-                'eventDate': event_date.strftime('%Y-%m-%d')
-            }
+            'timeFrame': time_frame,
+            'lod': lod
         })
     
+    except PoolBusyError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503
+    
+    except PoolTimeoutError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 504
+    
     except Exception as e:
         import traceback
-        error_trace = traceback.format_exc()
         print(f"Error in simulate_strategies: {str(e)}")
-        print(error_trace)
+        print(traceback.format_exc())
         return jsonify({
             'status': 'error',
-            'message': str(e),
-            'trace': error_trace
+            'message': str(e)
         }), 500
 
-def simulate_custom_portfolio(base_data, impact_idx, investments, total_amount):
+def simulate_custom_portfolio(base_series, impact_idx, portfolio, seed=None, strategies=PORTFOLIO_STRATEGIES):
     """
     Simulate the performance of a custom portfolio with different strategies
     
+    Each holding follows its own return series (real prices for tickers in the
+    price store, otherwise a beta/volatility profile over the market index).
+    The portfolio is the amount-weighted sum of the holdings.
+    
     Args:
-        base_data: List of market data points with the event impact
+        base_series: MarketSeries with the event impact
         impact_idx: Index of the event impact start
-        investments: List of user-defined investments with amounts
-        total_amount: Total investment amount
+        portfolio: Validated Portfolio of the selected investments
+        seed: Optional seed for the per-holding returns
+        strategies: Built-in strategy names or StrategySpecs to simulate
     
     Returns:
-        Dictionary with data for each strategy
+        Tuple of (StrategyResult per strategy, per-stock results keyed by investment id)
     """
-    strategies = ['hold', 'withdraw', 'add']
-    result = {}
-    individual_stocks = {}
+    names = strategy_names(strategies)
     
     # Log information about the portfolio we're simulating
-    investment_names = [inv['name'] for inv in investments]
-    print(f"Simulating custom portfolio: {investment_names} with total ${total_amount}")
-    
-    # First, simulate each individual stock
-    for investment in investments:
-        stock_name = investment['name']
-        investment_amount = float(investment['amount'])
-        stock_strategies = {}
-        
-        for strategy in strategies:
-            stock_data = []
-            # Start with the investment amount
-            stock_value = investment_amount
-            
-            for i, day_data in enumerate(base_data):
-                # Apply the strategy change at the impact date
-                if i == impact_idx:
-                    if strategy == 'withdraw':
-                        # Withdraw 20% of the stock value
-                        withdrawal_amount = stock_value * 0.2
-                        stock_value -= withdrawal_amount
-                    elif strategy == 'add':
-                        # Add 20% of the original investment
-                        additional_amount = investment_amount * 0.2
-                        stock_value += additional_amount
-                
-                # Calculate daily return based on market change
-                if i > 0:
+    print(f"Simulating custom portfolio: {len(portfolio)} holdings with total ${portfolio.total:.2f}")
+    portfolio_holdings.observe(len(portfolio))
+    
+    # Build the shared (holdings x days) growth matrix once, then simulate
+    # every stock and the overall portfolio under every strategy at once.
+    # Large portfolios run in the process pool so request threads stay free.
+    store = getattr(price_source, 'store', None)
+    kernel_args = (base_series, impact_idx, portfolio, seed, store.root_dir if store else None, strategies)
+    with span('simulate_holdings'):
+        if len(portfolio) * len(base_series) >= COMPUTE_OFFLOAD_CELLS:
+            stock_values, portfolio_values, unit_growth = compute_pool.run(simulate_portfolio_kernel, *kernel_args)
+        else:
+            stock_values, portfolio_values, unit_growth = simulate_portfolio_kernel(*kernel_args)
+    
+    # Wrap each value array as a view over the shared base series
+    individual_stocks = {}
+    for investment, values in zip(portfolio.investments, stock_values):
+        individual_stocks[investment.id] = {
+            'name': investment.name,
+            'initialAmount': investment.amount,
+            'strategies': {
+                strategy: StrategyResult(base_series, strategy_values, 'stock_value', include_prices=False)
+                for strategy, strategy_values in zip(names, values)
+            }
+        }
+    
+    result = {
+        strategy: StrategyResult(base_series, values, include_prices=False, unit_growth=growth)
+        for strategy, values, growth in zip(names, portfolio_values, unit_growth)
+    }
+    
+    return result, individual_stocks
+
+@api.route('/api/simulate-batch', methods=['POST'])
+def simulate_batch():
+    """
+    Simulate every combination of several events and portfolios in one request.
+    
+    Each event's series is generated once and shared by all its portfolios,
+    and identical (event, portfolio) pairs are simulated once. Items run on
+    the batch thread pool and are streamed as NDJSON in the order they finish:
+    a 'meta' line, one 'scenario' line per distinct event with its shared date
+    axis and prices, one 'result' line per item and a final 'done' line.
+    """
+    try:
+        data = parse_body(request.get_json(silent=True))
+        events, portfolios = parse_batch(data, MAX_BATCH_ITEMS, MAX_PORTFOLIO_HOLDINGS)
+        specs = parse_strategies(data, MAX_STRATEGIES)
+        seed = parse_seed(data)
+        points, _ = parse_lod(request.args, ('lttb',))
+        
+        # Resolve each distinct event to its shared scenario, and its chart rows, once
+        scenarios = {}
+        lods = {}
+        for description in dict.fromkeys(events):
+            matched_event = match_event(description)
+            start_date, end_date = event_window(matched_event['date'])
+            key, base_series, _, impact_idx = get_event_scenario(matched_event, start_date, end_date, seed)
+            scenarios[description] = (matched_event, start_date, end_date, key, base_series, impact_idx)
+            lods[description] = scenario_lod(key, base_series, points, 'lttb')
+        
+        check_strategy_cells(
+            max(len(scenario[4]) for scenario in scenarios.values()),
+            max(len(portfolio) for portfolio in portfolios),
+            specs
+        )
+        
+        def simulate_item(description, portfolio):
+            _, _, _, key, base_series, impact_idx = scenarios[description]
+            if not portfolio:
+                return default_strategy_results(base_series, impact_idx, specs), {}
+            return portfolio_strategy_results(key, base_series, impact_idx, portfolio, specs)
+        
+        def generate():
+            yield {
+                'type': 'meta',
+                'status': 'success',
+                'items': len(events) * len(portfolios),
+                'events': events,
+                'portfolios': [portfolio.id for portfolio in portfolios]
+            }
+            for description, (matched_event, start_date, end_date, key, base_series, _) in scenarios.items():
+                indices, lod = lods[description]
+                prices = (base_series if indices is None else base_series.take(indices)).columns()
+                yield {
+                    'type': 'scenario',
+                    'events': [e for e, other in enumerate(events) if other == description],
+                    'eventName': matched_event['name'],
+                    'seed': scenario_seed(key),
+                    'timeFrame': event_time_frame(matched_event['date'], start_date, end_date),
+                    'dates': prices.pop('date'),
+                    'prices': prices,
+                    'lod': lod
+                }
+        
+            # Submit each distinct (event, portfolio) pair once; duplicates share its future
+            hashes = [portfolio_hash(portfolio.investments) if portfolio else None for portfolio in portfolios]
+            futures = {}
+            items = {}
+            failed = 0
+            for e, description in enumerate(events):
+                for p, portfolio in enumerate(portfolios):
+                    pair = (description, hashes[p])
+                    if pair not in futures:
+                        futures[pair] = batch_executor.submit(simulate_item, description, portfolio)
+                    items.setdefault(futures[pair], []).append((e, p))
+        
+            try:
+                for future in as_completed(items):
                     try:
-                        # Try to get the value using the 'value' key
-                        if 'value' in base_data[i-1]:
-                            previous_market_value = base_data[i-1]['value']
-                            current_market_value = day_data['value']
-                        # Fall back to 'close' if 'value' is not present
-                        elif 'close' in base_data[i-1]:
-                            previous_market_value = base_data[i-1]['close']
-                            current_market_value = day_data['close']
-                        else:
-                            print(f"Warning: No value or close key in data point: {base_data[i-1]}")
-                            previous_market_value = 100
-                            current_market_value = 100
-                        
-                        daily_return = (current_market_value - previous_market_value) / previous_market_value
-                        stock_value *= (1 + daily_return)
-                    except Exception as e:
-                        print(f"Error calculating return for day {i} and stock {stock_name}: {str(e)}")
-                        # In case of error, assume no change for this day
-                        pass
+                        strategies_data, individual_stocks = future.result()
+                    except Exception as ex:
+                        print(f"Error in simulate_batch: {str(ex)}")
+                        for e, p in items[future]:
+                            failed += 1
+                            yield {'type': 'result', 'event': e, 'portfolio': p, 'status': 'error', 'message': str(ex)}
+                        continue
                 
-                stock_data.append({
-                    'date': day_data['date'],
-                    'stock_value': stock_value
-                })
-            
-            stock_strategies[strategy] = stock_data
+                    # The items sharing a future are all for one event, and so share its chart rows
+                    indices, _ = lods[events[items[future][0][0]]]
+                    summary_data = strategies_data
+                    if indices is not None:
+                        strategies_data, individual_stocks = downsample_strategy_results(
+                            strategies_data, individual_stocks, indices
+                        )
+                    columns = strategy_columns(strategies_data, individual_stocks)
+                    for e, p in items[future]:
+                        yield {
+                            'type': 'result',
+                            'event': e,
+                            'portfolio': p,
+                            'status': 'success',
+                            'summary': strategy_summary(summary_data, scenarios[events[e]][0]),
+                            'strategies': columns['strategies'],
+                            'individualStocks': columns['individualStocks']
+                        }
+            finally:
+                # Drop queued items if the client went away mid-stream
+                for future in items:
+                    future.cancel()
         
-        individual_stocks[investment['id']] = {
-            'name': stock_name,
-            'initialAmount': investment_amount,
-            'strategies': stock_strategies
-        }
+            yield {'type': 'done', 'items': len(events) * len(portfolios), 'failed': failed}
+        
+        return ndjson_response(generate())
+        
+    except ValidationError as e:
+        return validation_error_response(e)
     
-    # Then, simulate the overall portfolio
-    for strategy in strategies:
-        portfolio_data = []
-        # Start with the total investment amount
-        portfolio_value = total_amount
-        
-        for i, day_data in enumerate(base_data):
-            # Apply the strategy change at the impact date
-            if i == impact_idx:
-                if strategy == 'withdraw':
-                    # Withdraw 20% of the portfolio
-                    withdrawal_amount = portfolio_value * 0.2
-                    portfolio_value -= withdrawal_amount
-                elif strategy == 'add':
-                    # Add 20% of the original investment
-                    additional_amount = total_amount * 0.2
-                    portfolio_value += additional_amount
+    except Exception as e:
+        print(f"Error in simulate_batch: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@api.route('/api/monte-carlo', methods=['POST'])
+def monte_carlo():
+    """Simulate strategy outcome distributions over many random paths of an event"""
+    try:
+        try:
+            data = parse_body(request.get_json(silent=True))
+            event = parse_event(data)
+            seed = parse_seed(data)
+            n_paths, percentiles = parse_monte_carlo(data, MAX_MONTE_CARLO_PATHS)
+        except ValidationError as e:
+            return validation_error_response(e)
+        
+        matched_event = match_event(event)
+        event_date = matched_event['date']
+        start_date, end_date = event_window(event_date)
+        
+        # Seed from the request or the scenario key so repeated requests return the same distribution
+        key = scenario_key(
+            matched_event['name'], start_date, end_date, matched_event['severity'], seed, source=price_source.name
+        )
+        
+        with span('monte_carlo'):
+            results = run_monte_carlo(
+                start_date,
+                end_date,
+                event_date,
+                matched_event['severity'],
+                n_paths,
+                scenario_seed(key),
+                percentiles=percentiles
+            )
+        
+        return jsonify({
+            'status': 'success',
+            'eventName': matched_event['name'],
+            'eventDate': event_date.strftime('%Y-%m-%d'),
+            'eventSeverity': f"{round(matched_event['severity'] * 100, 1)}%",
+            'seed': scenario_seed(key),
+            **results,
+            'timeFrame': {
+                'startDate': start_date.strftime('%Y-%m-%d'),
+                'endDate': end_date.strftime('%Y-%m-%d'),
+                'eventDate': event_date.strftime('%Y-%m-%d')
+            }
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def sweep_grid(matched_event, start_date, end_date, seed, portfolio, severities, offsets, cash_flows):
+    """
+    Evaluate every trade of a sweep, one severity at a time.
+    
+    Every severity uses the same seed, so its scenario differs from the others
+    only in the event impact. Large portfolios run in the process pool.
+    
+    Returns:
+        Tuple of (dollar edges over holding, shape (actions, severities, offsets, cash_flows, holdings),
+        final hold values (severities, holdings), the trade dates)
+    """
+    holdings = max(len(portfolio), 1)
+    edges = np.empty((len(SWEEP_ACTIONS), len(severities), len(offsets), len(cash_flows), holdings))
+    hold_values = np.empty((len(severities), holdings))
+    holdings_seed = [seed, int(portfolio_hash(portfolio.investments), 16)] if portfolio else None
+    store = getattr(price_source, 'store', None)
+    
+    for s, severity in enumerate(severities):
+        _, base_series, _, impact_idx = get_event_scenario(
+            dict(matched_event, severity=severity), start_date, end_date, seed
+        )
+        trade_days = impact_idx + np.array(offsets)
+        if trade_days.min() < 0 or trade_days.max() >= len(base_series):
+            raise ValidationError(
+                f"offsets must be between {-impact_idx} and {len(base_series) - 1 - impact_idx} for this event"
+            )
+        if not portfolio:
+            # The default index portfolio: one unit of the index itself
+            growth = cumulative_growth(base_series.close)[None, :]
+            edges[:, s] = trade_edges(growth, impact_idx, offsets, cash_flows)
+            hold_values[s] = growth[:, -1]
+            continue
+        kernel_args = (
+            base_series, impact_idx, portfolio, holdings_seed, offsets, cash_flows, store.root_dir if store else None
+        )
+        if len(portfolio) * len(base_series) >= COMPUTE_OFFLOAD_CELLS:
+            edges[:, s], hold_values[s] = compute_pool.run(sweep_portfolio_kernel, *kernel_args)
+        else:
+            edges[:, s], hold_values[s] = sweep_portfolio_kernel(*kernel_args)
+    
+    dates = base_series.date_strings()
+    return edges, hold_values, [dates[day] for day in trade_days]
+
+@api.route('/api/sensitivity-sweep', methods=['POST'])
+def sensitivity_sweep():
+    """
+    Compare one-off withdraw/add trades with holding over a grid of
+    event severities, trade days and trade sizes.
+    
+    Results are percentages of the initial investment gained over holding,
+    as nested lists indexed [severity][offset][cashFlow] per action.
+    """
+    try:
+        try:
+            data = parse_body(request.get_json(silent=True))
+            event = parse_event(data)
+            portfolio = parse_portfolio(data, MAX_PORTFOLIO_HOLDINGS)
+            seed = parse_seed(data)
+        except ValidationError as e:
+            return validation_error_response(e)
+        
+        matched_event = match_event(event)
+        event_date = matched_event['date']
+        start_date, end_date = event_window(event_date)
+        
+        try:
+            severities, offsets, cash_flows, per_holding = parse_sweep(
+                data, matched_event['severity'], MAX_SWEEP_SEVERITIES, MAX_SWEEP_AXIS_LENGTH
+            )
+            cells = len(SWEEP_ACTIONS) * len(severities) * len(offsets) * len(cash_flows) * max(len(portfolio), 1)
+            if cells > MAX_SWEEP_CELLS:
+                raise ValidationError(
+                    f'Sweep too large: actions x severities x offsets x cash flows x holdings must be at most {MAX_SWEEP_CELLS}'
+                )
             
-            # Calculate daily return based on market change
-            if i > 0:
-                # Check if the data structure has 'value' or 'close' key
-                try:
-                    # Try to get the value using the 'value' key
-                    if 'value' in base_data[i-1]:
-                        previous_market_value = base_data[i-1]['value']
-                        current_market_value = day_data['value']
-                    # Fall back to 'close' if 'value' is not present
-                    elif 'close' in base_data[i-1]:
-                        previous_market_value = base_data[i-1]['close']
-                        current_market_value = day_data['close']
-                    else:
-                        # If neither key exists, print the data structure and use a fallback value
-                        print(f"Warning: No value or close key in data point: {base_data[i-1]}")
-                        # Use a fallback - assume no change
-                        previous_market_value = 100
-                        current_market_value = 100
-                    
-                    # Calculate the daily return only if we can determine the values
-                    daily_return = (current_market_value - previous_market_value) / previous_market_value
-                    portfolio_value *= (1 + daily_return)
-                except Exception as e:
-                    print(f"Error calculating return for day {i}: {str(e)}")
-                    print(f"Previous day data: {base_data[i-1]}")
-                    print(f"Current day data: {day_data}")
-                    # In case of error, assume no change for this day
-                    pass
+            # Without an explicit seed, use the event's own scenario seed, so the sweep
+            # at the event's severity matches /api/simulate-strategies
+            if seed is None:
+                seed = scenario_seed(scenario_key(
+                    matched_event['name'], start_date, end_date, matched_event['severity'], source=price_source.name
+                ))
             
-            portfolio_data.append({
-                'date': day_data['date'],
-                'portfolio_value': portfolio_value
-            })
+            with span('sensitivity_sweep'):
+                edges, hold_values, trade_dates = sweep_grid(
+                    matched_event, start_date, end_date, seed, portfolio, severities, offsets, cash_flows
+                )
+        except ValidationError as e:
+            return validation_error_response(e)
+        
+        initial_total = portfolio.total if portfolio else 1.0
+        grid = edges.sum(axis=-1) / initial_total * 100
+        
+        best = {}
+        for a, action in enumerate(SWEEP_ACTIONS):
+            s, o, c = np.unravel_index(np.argmax(grid[a]), grid[a].shape)
+            best[action] = {
+                'severity': severities[s],
+                'offset': offsets[o],
+                'tradeDate': trade_dates[o],
+                'cashFlow': cash_flows[c],
+                'edgePercent': round(float(grid[a, s, o, c]), 4)
+            }
+        
+        result = {
+            'status': 'success',
+            'seed': seed,
+            'eventName': matched_event['name'],
+            'timeFrame': event_time_frame(event_date, start_date, end_date),
+            'axes': {
+                'action': list(SWEEP_ACTIONS),
+                'severity': severities,
+                'offset': offsets,
+                'tradeDate': trade_dates,
+                'cashFlow': cash_flows
+            },
+            'grid': {action: np.round(grid[a], 4) for a, action in enumerate(SWEEP_ACTIONS)},
+            'holdReturn': np.round((hold_values.sum(axis=-1) / initial_total - 1) * 100, 4),
+            'best': best
+        }
+        
+        if per_holding and portfolio:
+            # Each holding's edge as a percentage of its own initial amount
+            with np.errstate(divide='ignore', invalid='ignore'):
+                holding_grid = np.where(portfolio.amounts > 0, edges / portfolio.amounts * 100, 0.0)
+            result['holdings'] = {
+                investment.id: {
+                    action: np.round(holding_grid[a, ..., h], 4) for a, action in enumerate(SWEEP_ACTIONS)
+                }
+                for h, investment in enumerate(portfolio.investments)
+            }
         
-        result[strategy] = portfolio_data
+        return jsonify(result)
     
-    return result, individual_stocks
+    except PoolBusyError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503
+    
+    except PoolTimeoutError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 504
+    
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@api.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness check: the worker process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@api.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness check: fails while the worker drains during shutdown"""
+    ready = not draining and compute_pool.healthy()
+    return jsonify({
+        'status': 'ready' if ready else 'unavailable',
+        'priceSource': price_source.name,
+        'events': len(registry),
+        'computePool': compute_pool.stats()
+    }), 200 if ready else 503
+
+def shutdown():
+    """Stop taking new work and let in-flight simulations finish"""
+    global draining
+    draining = True
+    batch_executor.shutdown(wait=True, cancel_futures=True)
+    compute_pool.shutdown(wait=True)
+    narrative_pipeline.shutdown(wait=True)
+
+@api.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Report scenario cache occupancy and hit/miss counters"""
+    return jsonify({
+        'status': 'success',
+        'cache': scenario_cache.stats()
+    })
+
+def analyze_market_impact(stats):
+    """Queue the narrative analysis of an event's impact on the market"""
+    return narrative_pipeline.submit(stats)
 
-def get_event_time_period(event):
-    """Use OpenAI to determine the appropriate time period for a global event"""
-    # With mock data, we don't need this function any more
-    pass
+@api.route('/api/analysis/<job_id>', methods=['GET'])
+def get_analysis(job_id):
+    """Poll the status of a narrative analysis job"""
+    job = narrative_pipeline.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Unknown analysis job'
+        }), 404
+    
+    return jsonify({
+        'status': 'success',
+        'job': job.to_dict()
+    })
+
+@api.route('/api/analysis/<job_id>/stream', methods=['GET'])
+def stream_analysis(job_id):
+    """Stream a narrative analysis job as server-sent events until it finishes"""
+    job = narrative_pipeline.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Unknown analysis job'
+        }), 404
+    
+    # The stream outlives the request context, so hold on to the app's JSON provider
+    json_provider = current_app.json
+    
+    def events():
+        # Heartbeat comments keep proxies from closing the connection while waiting
+        deadline = time.monotonic() + NARRATIVE_STREAM_TIMEOUT
+        while not job.done.wait(timeout=15):
+            if time.monotonic() > deadline:
+                yield f"event: timeout\ndata: {json_provider.dumps(job.to_dict())}\n\n"
+                return
+            yield ": waiting\n\n"
+        yield f"event: analysis\ndata: {json_provider.dumps(job.to_dict())}\n\n"
+    
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+def create_app():
+    """
+    Build the Flask app.
+    
+    Caches, pools and the price source are created when this module is
+    imported and shared by every app built in the process. Heavy optional
+    dependencies (pandas, yfinance, openai) are only imported by the price
+    store and narrative client that use them.
+    """
+    app = Flask(__name__)
+    app.json = MarketJSONProvider(app)
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    app.register_blueprint(api)
+    
+    if os.getenv("PREWARM_SCENARIOS", "").lower() in ("1", "true", "yes"):
+        prewarm_scenarios()
+    
+    return app
 
-def analyze_market_impact(event, market_data, time_period):
-    """Generate an analysis of the event's impact on the market"""
-    # With mock data, we don't need this function any more
-    pass
+def __getattr__(name):
+    # `from app import app` builds the default app on first use
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
@@ -0,0 +1,479 @@
+"""
+Benchmarks for the market generators, simulators, serialization and endpoints.
+
+    python benchmarks.py run                           # run everything and print a table
+    python benchmarks.py run --output bench.json       # record the results
+    python benchmarks.py run --baseline bench.json     # compare against a recorded run
+    python benchmarks.py run --filter portfolio        # only benchmarks whose name contains 'portfolio'
+    python benchmarks.py list
+    python benchmarks.py startup                       # import cost of a cold start, by module
+
+Every benchmark uses fixed seeds, the mock price source, the stub narrative
+client and inline simulations, so runs are offline and repeatable. Each
+benchmark has a latency budget for its median time. The run exits with
+status 1 if a budget is exceeded or, with --baseline, if a median is more
+than --tolerance times the baseline median.
+
+The startup report imports the app in a fresh interpreter under
+`python -X importtime`, builds it with create_app, and breaks the import
+time down by top-level package. It exits with status 1 if the cold start
+takes longer than --budget seconds.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Keep the app offline and deterministic; set before the app is imported
+os.environ['PRICE_SOURCE'] = 'mock'
+os.environ['NARRATIVE_CLIENT'] = 'stub'
+os.environ['COMPUTE_PROCESSES'] = '0'
+os.environ['SCENARIO_CACHE_DIR'] = ''
+os.environ['PREWARM_SCENARIOS'] = '0'
+
+import numpy as np
+
+from market_engine import generate_event_impact_series
+from simulation import simulate_investment_strategy
+from serialization import strategy_columns, flatten_strategy_columns, encode_binary
+from holdings import HOLDING_PROFILES
+from models import parse_portfolio
+from event_registry import registry
+from scenario_store import SharedScenarioStore
+
+SEED = 20240101
+
+# Registered events, so no request falls back to a randomly dated generic event
+EVENT = 'covid pandemic'
+BATCH_EVENTS = ['covid pandemic', '2008 financial crisis', 'dot com bubble']
+
+# Name -> (function returning the callable to time, budget in seconds for the median)
+BENCHMARKS = {}
+
+
+def benchmark(name, budget):
+    """Register a benchmark. The decorated function does the setup and returns the callable to time."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, budget)
+        return setup
+    return register
+
+
+def _window(years):
+    """Return (start, impact, end) dates of a window `years` long with the impact in the middle"""
+    impact_date = datetime(2000, 3, 10)
+    half = timedelta(days=365 * years / 2)
+    return impact_date - half, impact_date, impact_date + half
+
+
+def _investments(n):
+    tickers = list(HOLDING_PROFILES)
+    return [
+        {'id': i, 'name': f'{tickers[i % len(tickers)]} - Holding {i}', 'amount': 1000 + 10 * i}
+        for i in range(n)
+    ]
+
+
+def _portfolio(n):
+    investments = _investments(n)
+    return parse_portfolio(
+        {'investments': investments, 'selectedInvestments': [inv['id'] for inv in investments]}, max_holdings=n
+    )
+
+
+def _scenario(years):
+    start_date, impact_date, end_date = _window(years)
+    series, _, impact_idx = generate_event_impact_series(
+        start_date, end_date, impact_date, 0.3, np.random.default_rng(SEED)
+    )
+    return series.freeze(), impact_idx
+
+
+_app_module = None
+
+
+def _app():
+    global _app_module
+    if _app_module is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+        _app_module = app_module
+    return _app_module
+
+
+def _quiet(fn):
+    """Wrap fn so its progress prints do not end up in the timings"""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+
+# Generation over 1, 5 and 25-year windows
+for _years, _budget in ((1, 0.005), (5, 0.02), (25, 0.1)):
+    @benchmark(f'generate:event_impact:{_years}y', _budget)
+    def _generate(years=_years):
+        start_date, impact_date, end_date = _window(years)
+        return lambda: generate_event_impact_series(
+            start_date, end_date, impact_date, 0.3, np.random.default_rng(SEED)
+        )
+
+
+@benchmark('simulate:default_strategies:5y', 0.005)
+def _default_strategies():
+    series, impact_idx = _scenario(5)
+    return lambda: [
+        simulate_investment_strategy(series, impact_idx, strategy) for strategy in ('withdraw', 'add', 'hold')
+    ]
+
+
+# Custom portfolios with 1 to 1000 holdings over a 5-year window
+for _holdings, _budget in ((1, 0.005), (10, 0.01), (100, 0.05), (1000, 0.5)):
+    @benchmark(f'simulate:custom_portfolio:{_holdings}', _budget)
+    def _custom_portfolio(holdings=_holdings):
+        series, impact_idx = _scenario(5)
+        portfolio = _portfolio(holdings)
+        simulate = _app().simulate_custom_portfolio
+        return _quiet(lambda: simulate(series, impact_idx, portfolio, SEED))
+
+
+def _portfolio_results(holdings):
+    series, impact_idx = _scenario(5)
+    portfolio = _portfolio(holdings)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _app().simulate_custom_portfolio(series, impact_idx, portfolio, SEED)
+
+
+# Serialization of a 100-holding, 5-year result in each response format
+@benchmark('serialize:json:100', 2.0)
+def _serialize_json():
+    app = _app().app
+    strategies_data, individual_stocks = _portfolio_results(100)
+    payload = {'strategies': strategies_data, 'individualStocks': individual_stocks}
+
+    def run():
+        with app.app_context():
+            return app.json.dumps(payload)
+    return run
+
+
+# Attaching a 1000-holding result from the shared scenario store (mapped, not copied)
+@benchmark('store:attach:1000', 0.05)
+def _store_attach():
+    store_dir = tempfile.TemporaryDirectory(prefix='scenario-store-')
+    store = SharedScenarioStore(store_dir.name)
+    store.put(('benchmark',), _portfolio_results(1000))
+
+    def run(directory=store_dir):
+        # The closure keeps the temporary directory alive until the run ends
+        return store.attach(('benchmark',))
+    return run
+
+
+@benchmark('serialize:columnar:100', 1.0)
+def _serialize_columnar():
+    app = _app().app
+    strategies_data, individual_stocks = _portfolio_results(100)
+
+    def run():
+        with app.app_context():
+            return app.json.dumps(strategy_columns(strategies_data, individual_stocks))
+    return run
+
+
+@benchmark('serialize:binary:100', 0.02)
+def _serialize_binary():
+    strategies_data, individual_stocks = _portfolio_results(100)
+
+    def run():
+        columns, stocks = flatten_strategy_columns(strategy_columns(strategies_data, individual_stocks))
+        return encode_binary(columns, {'individualStocks': stocks})
+    return run
+
+
+def _endpoint(method, path, body=None):
+    """Time a request through the Flask test client, with the scenario cache cleared every round"""
+    app_module = _app()
+    client = app_module.app.test_client()
+
+    def run():
+        app_module.scenario_cache.clear()
+        response = client.open(path, method=method, json=body)
+        data = response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}: {data[:200]!r}")
+        return data
+    return _quiet(run)
+
+
+@benchmark('endpoint:market-data', 0.1)
+def _market_data():
+    return _endpoint('GET', '/api/market-data')
+
+
+@benchmark('endpoint:analyze-event', 0.05)
+def _analyze_event():
+    return _endpoint('POST', '/api/analyze-event', {'event': EVENT})
+
+
+@benchmark('endpoint:simulate-strategies:default', 0.05)
+def _simulate_default():
+    return _endpoint('POST', '/api/simulate-strategies', {'event': EVENT})
+
+
+@benchmark('endpoint:simulate-strategies:100', 1.0)
+def _simulate_custom():
+    investments = _investments(100)
+    return _endpoint('POST', '/api/simulate-strategies', {
+        'event': EVENT,
+        'investments': investments,
+        'selectedInvestments': [inv['id'] for inv in investments]
+    })
+
+
+@benchmark('endpoint:simulate-strategies:100:points=256', 1.0)
+def _simulate_custom_downsampled():
+    investments = _investments(100)
+    return _endpoint('POST', '/api/simulate-strategies?points=256', {
+        'event': EVENT,
+        'investments': investments,
+        'selectedInvestments': [inv['id'] for inv in investments]
+    })
+
+
+@benchmark('endpoint:simulate-batch:3x3', 1.0)
+def _simulate_batch():
+    portfolios = [{'id': 'default'}] + [
+        {'id': n, 'investments': _investments(n), 'selectedInvestments': list(range(n))}
+        for n in (10, 50)
+    ]
+    return _endpoint('POST', '/api/simulate-batch', {'events': BATCH_EVENTS, 'portfolios': portfolios})
+
+
+@benchmark('endpoint:sensitivity-sweep:100', 0.5)
+def _sensitivity_sweep():
+    investments = _investments(100)
+    return _endpoint('POST', '/api/sensitivity-sweep', {
+        'event': EVENT,
+        'investments': investments,
+        'selectedInvestments': [inv['id'] for inv in investments],
+        'severities': [0.1, 0.2, 0.3, 0.4, 0.5],
+        'offsets': list(range(0, 60, 2)),
+        'cashFlows': [0.05, 0.1, 0.2, 0.3, 0.5]
+    })
+
+
+@benchmark('endpoint:monte-carlo:1000', 0.5)
+def _monte_carlo():
+    return _endpoint('POST', '/api/monte-carlo', {'event': EVENT, 'paths': 1000, 'seed': SEED})
+
+
+def measure(fn, repeat=5, min_time=0.2):
+    """
+    Time fn after one warm-up call.
+
+    Runs at least `repeat` rounds, and more until `min_time` seconds have
+    passed, so fast benchmarks get enough rounds for a stable median.
+
+    Returns:
+        Dictionary with the 'median', 'min' and 'mean' round time in seconds and the 'rounds' count
+    """
+    fn()
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeat or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'mean': statistics.fmean(timings),
+        'rounds': len(timings)
+    }
+
+
+def check_events():
+    """Raise ValueError if a benchmark event is not in the registry and would be timed as a generic event"""
+    unmatched = [event for event in [EVENT, *BATCH_EVENTS] if registry.match(event) is None]
+    if unmatched:
+        raise ValueError(f"Benchmark events not in the event registry: {', '.join(unmatched)}")
+
+
+def run_benchmarks(names, repeat=5):
+    check_events()
+    results = {}
+    for name in names:
+        setup, budget = BENCHMARKS[name]
+        results[name] = dict(measure(setup(), repeat), budget=budget)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Check results against their budgets and a baseline run.
+
+    Returns:
+        List of failure messages (empty if everything passed)
+    """
+    failures = []
+    for name, result in results.items():
+        if result['median'] > result['budget']:
+            failures.append(f"{name}: median {result['median'] * 1000:.2f} ms is over its "
+                            f"{result['budget'] * 1000:.0f} ms budget")
+        base = baseline.get(name)
+        if base and result['median'] > base['median'] * tolerance:
+            failures.append(f"{name}: median {result['median'] * 1000:.2f} ms is "
+                            f"{result['median'] / base['median']:.2f}x the baseline "
+                            f"{base['median'] * 1000:.2f} ms")
+    return failures
+
+
+def print_table(results, baseline):
+    print(f"{'benchmark':<40} {'median ms':>10} {'min ms':>10} {'budget ms':>10} {'vs base':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        ratio = f"{result['median'] / base['median']:.2f}x" if base else '-'
+        print(f"{name:<40} {result['median'] * 1000:>10.2f} {result['min'] * 1000:>10.2f} "
+              f"{result['budget'] * 1000:>10.0f} {ratio:>8}")
+
+
+# Cold start (imports plus create_app) budget in seconds
+STARTUP_BUDGET = 1.0
+
+_STARTUP_SCRIPT = (
+    "import time; started = time.perf_counter(); import app; app.create_app(); "
+    "print(time.perf_counter() - started)"
+)
+
+
+def startup_report(limit=15, narrative_client='stub'):
+    """
+    Measure a cold start of the app in a fresh interpreter.
+
+    Args:
+        limit: Packages to list
+        narrative_client: NARRATIVE_CLIENT the app starts with ('stub' or 'openai');
+            'openai' uses a placeholder API key when OPENAI_API_KEY is unset
+
+    Returns:
+        Dictionary with the 'total' seconds to import and build the app, the
+        'packages' as (name, seconds) pairs sorted by self import time, and the
+        child's peak resident memory in MiB as 'maxRssMiB' (None where unavailable)
+    """
+    env = dict(os.environ, NARRATIVE_CLIENT=narrative_client)
+    if narrative_client == 'openai':
+        # Building the client needs a key but no network
+        env.setdefault('OPENAI_API_KEY', 'startup-benchmark')
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _STARTUP_SCRIPT],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True
+    )
+    # Lines look like "import time:  self [us] | cumulative | module", indented by nesting
+    packages = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        package = module.strip().split('.')[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+
+    max_rss = None
+    try:
+        import resource
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2 ** 20
+    except ImportError:
+        pass
+
+    return {
+        'total': float(completed.stdout.strip().splitlines()[-1]),
+        'packages': sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit],
+        'maxRssMiB': max_rss
+    }
+
+
+def print_startup_report(report):
+    print(f"{'package':<40} {'import ms':>10}")
+    for name, seconds in report['packages']:
+        print(f"{name:<40} {seconds * 1000:>10.2f}")
+    print(f"{'cold start (import + create_app)':<40} {report['total'] * 1000:>10.2f}")
+    if report['maxRssMiB'] is not None:
+        print(f"{'peak resident memory (MiB)':<40} {report['maxRssMiB']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks")
+    run_parser.add_argument('--filter', default='', help="Only run benchmarks whose name contains this text")
+    run_parser.add_argument('--repeat', type=int, default=5, help="Minimum timed rounds per benchmark")
+    run_parser.add_argument('--output', help="Write the results to this JSON file")
+    run_parser.add_argument('--baseline', help="Compare against the results in this JSON file")
+    run_parser.add_argument('--tolerance', type=float, default=1.25,
+                            help="Slowdown over the baseline median that counts as a regression")
+
+    subparsers.add_parser('list', help="List the benchmarks and their budgets")
+
+    startup_parser = subparsers.add_parser('startup', help="Report the import cost of a cold start")
+    startup_parser.add_argument('--limit', type=int, default=15, help="Packages to list")
+    startup_parser.add_argument('--budget', type=float, default=STARTUP_BUDGET,
+                                help="Cold start time in seconds that counts as a failure")
+    startup_parser.add_argument('--narrative-client', choices=('stub', 'openai'), default='stub',
+                                help="Narrative client the app starts with")
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name, (_, budget) in BENCHMARKS.items():
+            print(f"{name:<40} {budget * 1000:>8.0f} ms")
+        return
+
+    if args.command == 'startup':
+        report = startup_report(args.limit, args.narrative_client)
+        print_startup_report(report)
+        if report['total'] > args.budget:
+            print(f"FAIL cold start took {report['total'] * 1000:.2f} ms, over its {args.budget * 1000:.0f} ms budget")
+            sys.exit(1)
+        return
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    results = run_benchmarks(names, args.repeat)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'results': results
+            }, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    failures = compare(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+class PoolBusyError(Exception):
+    """Raised when the compute pool already has its maximum number of pending tasks"""
+
+
+class PoolTimeoutError(Exception):
+    """Raised when a task does not finish within the pool timeout"""
+
+
+class ComputePool:
+    """
+    Bounded process pool for CPU-heavy simulation work.
+
+    Tasks run in separate processes so request threads are never stuck behind
+    the GIL. At most max_pending tasks may be queued or running at once;
+    further submissions fail fast with PoolBusyError instead of piling up. A
+    task keeps its slot until it actually finishes, even after its caller
+    timed out.
+    The pool is created lazily on first use, so pre-forked web workers each
+    start their own after the fork.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, timeout=30):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def enabled(self):
+        return self.max_workers > 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Compute pool is shut down")
+            if self._executor is None:
+                # 'spawn' is safe to use from threaded web workers, unlike 'fork'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def run(self, fn, *args):
+        """
+        Run fn(*args) in the pool and wait for its result.
+
+        Runs inline when the pool is disabled (max_workers == 0).
+        """
+        if not self.enabled:
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusyError(f"Compute pool is busy ({self.max_pending} tasks pending)")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # A task that timed out keeps its worker busy until it finishes, so it
+        # holds its slot until then rather than until the caller gives up
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PoolTimeoutError(f"Computation did not finish within {self.timeout} seconds")
+        except BrokenProcessPool:
+            # A crashed worker breaks the executor; start a fresh one next time
+            with self._lock:
+                self._executor = None
+            raise
+
+    def healthy(self):
+        return not self._closed
+
+    def shutdown(self, wait=True):
+        """Stop accepting work and wait for running tasks to finish"""
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'maxWorkers': self.max_workers,
+            'maxPending': self.max_pending,
+            'started': self._executor is not None,
+            'closed': self._closed
+        }
@@ -0,0 +1,128 @@
+"""
+Level-of-detail downsampling for chart series.
+
+Two methods reduce a series to at most `points` rows:
+
+    lttb    Largest-Triangle-Three-Buckets: keeps the actual rows that best
+            preserve the shape of the close (or reference) line. The rows
+            holding the lowest and highest value are always kept, so crash
+            troughs and recovery peaks survive.
+    ohlc    Bucket aggregation into candles: first open, highest high, lowest
+            low, last close and summed volume per bucket, dated by the
+            bucket's first day.
+
+LTTB picks one set of rows from a reference series and applies it to every
+series sharing that date axis, so strategy and holding values stay aligned.
+Requests are served from a pyramid of fixed levels (a requested point count
+is rounded down to the nearest level), which is built once per scenario and
+cached with it.
+"""
+import numpy as np
+
+from market_engine import MarketSeries
+
+DOWNSAMPLE_METHODS = ('lttb', 'ohlc')
+
+# Point counts precomputed for each cached scenario
+LOD_LEVELS = (64, 128, 256, 512, 1024, 2048, 4096)
+
+# Fewest points a downsampled series may have (the first, the last and one in between)
+MIN_POINTS = 3
+
+
+def lttb_indices(values, points):
+    """
+    Select `points` rows of a series with Largest-Triangle-Three-Buckets.
+
+    The first and last rows are always kept. Each bucket in between keeps
+    the row forming the largest triangle with the previously kept row and
+    the average of the next bucket. The buckets holding the series minimum
+    and maximum keep those rows instead.
+
+    Returns:
+        Sorted int64 array of row indices
+    """
+    values = np.asarray(values, dtype=np.float64)
+    size = len(values)
+    if points >= size:
+        return np.arange(size)
+
+    # Bucket b covers rows [edges[b], edges[b + 1]); row 0 and the last row are their own buckets
+    edges = np.concatenate(([0], np.linspace(1, size - 1, points - 1).astype(np.int64), [size]))
+    sums = np.add.reduceat(values, edges[:-1])
+    counts = np.diff(edges)
+    means = sums / counts
+    centers = (edges[:-1] + edges[1:] - 1) / 2
+
+    indices = np.empty(points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = size - 1
+    previous = 0
+    for b in range(1, points - 1):
+        rows = np.arange(edges[b], edges[b + 1])
+        # Twice the triangle area between the previous pick, each candidate and the next bucket's mean
+        area = np.abs(
+            (previous - centers[b + 1]) * (values[rows] - values[previous])
+            - (previous - rows) * (means[b + 1] - values[previous])
+        )
+        previous = indices[b] = rows[area.argmax()]
+
+    # Pin the extremes; the trough wins if both fall in one bucket
+    for extreme in (values.argmax(), values.argmin()):
+        bucket = np.searchsorted(edges, extreme, side='right') - 1
+        indices[bucket] = extreme
+    return indices
+
+
+def aggregate_ohlc(series, points):
+    """
+    Aggregate a MarketSeries into `points` candles.
+
+    Returns:
+        MarketSeries with at most `points` rows
+    """
+    size = len(series)
+    if points >= size:
+        return series
+    starts = np.arange(points) * size // points
+    ends = np.append(starts[1:], size) - 1
+    return MarketSeries(
+        series.dates[starts],
+        series.open[starts],
+        np.maximum.reduceat(series.high, starts),
+        np.minimum.reduceat(series.low, starts),
+        series.close[ends],
+        np.add.reduceat(series.volume, starts)
+    )
+
+
+def lod_level(points, size):
+    """
+    Resolve a requested point count to the level served.
+
+    Returns:
+        The largest pyramid level not above `points`, `points` itself if it
+        is below the smallest level, or None if the series is short enough
+        to send whole
+    """
+    if points >= size:
+        return None
+    levels = [level for level in LOD_LEVELS if level <= points]
+    return levels[-1] if levels else points
+
+
+def reduce_series(series, method, level):
+    """Return one level of a MarketSeries: LTTB row indices chosen on the close, or OHLC candles"""
+    if method == 'lttb':
+        return lttb_indices(series.close, level)
+    return aggregate_ohlc(series, level)
+
+
+def build_pyramid(series, method):
+    """
+    Precompute every pyramid level shorter than the series.
+
+    Returns:
+        Dictionary of level -> reduce_series result
+    """
+    return {level: reduce_series(series, method, level) for level in LOD_LEVELS if level < len(series)}
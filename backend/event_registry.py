@@ -0,0 +1,135 @@
+import json
+import os
+from collections import deque
+from datetime import datetime
+
+# Built-in catalog of historical market shocks, in matching priority order
+DEFAULT_EVENTS = [
+    {'keywords': ['covid'], 'name': 'COVID-19 Pandemic', 'date': datetime(2020, 2, 15), 'severity': 0.35},
+    {'keywords': ['financial crisis'], 'name': '2008 Financial Crisis', 'date': datetime(2008, 9, 15), 'severity': 0.40},
+    {'keywords': ['dot com'], 'name': 'Dot-com Bubble Burst', 'date': datetime(2000, 3, 10), 'severity': 0.30},
+    {'keywords': ['brexit'], 'name': 'Brexit Referendum', 'date': datetime(2016, 6, 23), 'severity': 0.15},
+    {'keywords': ['ukraine'], 'name': 'Russia-Ukraine Conflict', 'date': datetime(2022, 2, 24), 'severity': 0.12},
+    {'keywords': ['inflation'], 'name': 'Inflation Spike', 'date': datetime(2021, 10, 1), 'severity': 0.10}
+]
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a set of keywords.
+
+    Scanning a text costs O(len(text) + matches) no matter how many keywords
+    are registered.
+    """
+
+    def __init__(self, keywords):
+        # Each state is a dict of transitions; outputs[state] lists keyword ids ending there
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        for keyword_id, keyword in enumerate(keywords):
+            self._add(keyword, keyword_id)
+        self._build_failure_links()
+
+    def _add(self, keyword, keyword_id):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append(keyword_id)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def find_all(self, text):
+        """Return the set of keyword ids that occur in text"""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._outputs[state]:
+                found.update(self._outputs[state])
+        return found
+
+
+def load_events(path):
+    """
+    Load an event catalog from a JSON file.
+
+    The file holds a list of objects with 'keywords' (or a single 'key'),
+    'name', 'date' (YYYY-MM-DD) and 'severity'.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        raw_events = json.load(f)
+
+    events = []
+    for raw in raw_events:
+        keywords = raw.get('keywords') or [raw['key']]
+        events.append({
+            'keywords': [keyword.lower() for keyword in keywords],
+            'name': raw['name'],
+            'date': datetime.strptime(raw['date'], '%Y-%m-%d'),
+            'severity': float(raw['severity'])
+        })
+    return events
+
+
+class EventRegistry:
+    """Catalog of known events with a precompiled keyword matcher"""
+
+    def __init__(self, events):
+        self.events = list(events)
+        # Keyword ids map back to their event; earlier events win when several match
+        self._keyword_events = []
+        keywords = []
+        for event_idx, event in enumerate(self.events):
+            for keyword in event['keywords']:
+                keywords.append(keyword)
+                self._keyword_events.append(event_idx)
+        self._matcher = KeywordMatcher(keywords)
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    @classmethod
+    def from_env(cls):
+        """Load the catalog from EVENTS_FILE if set, otherwise use the built-in events"""
+        path = os.getenv("EVENTS_FILE")
+        return cls(load_events(path) if path else DEFAULT_EVENTS)
+
+    def match(self, text):
+        """
+        Find the registered event mentioned in a free-text description.
+
+        Returns:
+            Dictionary with 'name', 'date' and 'severity', or None if nothing matched
+        """
+        keyword_ids = self._matcher.find_all(text.lower())
+        if not keyword_ids:
+            return None
+        event = self.events[min(self._keyword_events[i] for i in keyword_ids)]
+        return {'name': event['name'], 'date': event['date'], 'severity': event['severity']}
+
+
+# Registry loaded once at import
+registry = EventRegistry.from_env()
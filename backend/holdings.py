@@ -0,0 +1,150 @@
+import re
+
+import numpy as np
+
+from price_store import PriceStore
+from seeding import generator
+from simulation import PORTFOLIO_STRATEGIES, cumulative_growth, simulate_holdings
+
+# Trading days per year, used to convert annualized volatility to daily
+TRADING_DAYS = 252
+
+# Default market beta and annualized volatility for the symbols offered in the frontend
+HOLDING_PROFILES = {
+    'SPY': {'beta': 1.0, 'volatility': 0.18},
+    'QQQ': {'beta': 1.2, 'volatility': 0.24},
+    'AAPL': {'beta': 1.2, 'volatility': 0.30},
+    'AMZN': {'beta': 1.3, 'volatility': 0.35},
+    'GOOGL': {'beta': 1.1, 'volatility': 0.30},
+    'MSFT': {'beta': 1.1, 'volatility': 0.27},
+    'TSLA': {'beta': 2.0, 'volatility': 0.60},
+    'BND': {'beta': 0.1, 'volatility': 0.06},
+    'VNQ': {'beta': 0.9, 'volatility': 0.25},
+    'GLD': {'beta': 0.1, 'volatility': 0.15}
+}
+
+# Investment names in the frontend look like "SPY - S&P 500 ETF"
+_TICKER_PREFIX = re.compile(r'^\s*([A-Za-z.\-]{1,10})\s+-\s+')
+
+
+def holding_ticker(investment):
+    """Return the ticker of an investment, from its 'ticker' field or its name prefix"""
+    ticker = investment.get('ticker')
+    if not ticker:
+        match = _TICKER_PREFIX.match(str(investment.get('name', '')))
+        ticker = match.group(1) if match else None
+    return ticker.upper() if ticker else None
+
+
+def holding_profile(investment):
+    """
+    Resolve the (ticker, beta, volatility) profile of a validated Investment.
+
+    Explicit beta/volatility values win over the defaults for its ticker.
+    Holdings with no profile track the market index exactly (beta 1, no
+    extra volatility).
+    """
+    defaults = HOLDING_PROFILES.get(investment.ticker, {})
+    beta = investment.beta if investment.beta is not None else defaults.get('beta', 1.0)
+    volatility = investment.volatility if investment.volatility is not None else defaults.get('volatility')
+    return investment.ticker, beta, volatility
+
+
+def _aligned_growth(store, ticker, dates):
+    """Cumulative growth of a stored ticker on the given dates, or None if not covered"""
+    if store is None or not store.covers(ticker, dates[0]):
+        return None
+    stored = store.load(ticker)
+    # Use the last stored close on or before each date
+    idx = np.searchsorted(stored.dates, dates, side='right') - 1
+    if idx[0] < 0:
+        return None
+    return cumulative_growth(np.asarray(stored.close)[idx])
+
+
+def holding_growth_matrix(base_series, investments, rng, store=None):
+    """
+    Build the cumulative growth of every holding over the base series dates.
+
+    Holdings whose ticker is in the price store use their real prices.
+    Otherwise returns follow a one-factor model: beta times the market's
+    daily return plus idiosyncratic noise. The noise is sized so that the
+    total volatility matches the holding's profile.
+
+    Args:
+        base_series: MarketSeries of the market index
+        investments: Sequence of validated Investment records
+        rng: numpy Generator for the idiosyncratic noise
+        store: Optional PriceStore with real per-ticker prices
+
+    Returns:
+        Array of shape (holdings, days)
+    """
+    close = np.asarray(base_series.close, dtype=np.float64)
+    days = len(close)
+    growth = np.empty((len(investments), days))
+    if days == 0:
+        return growth
+
+    market_returns = np.zeros(days)
+    market_returns[1:] = close[1:] / close[:-1] - 1
+    market_variance = market_returns[1:].var() if days > 2 else 0.0
+
+    profiles = [holding_profile(investment) for investment in investments]
+    betas = np.array([beta for _, beta, _ in profiles])
+    idio_std = np.zeros(len(profiles))
+    for h, (_, beta, volatility) in enumerate(profiles):
+        if volatility is not None:
+            daily_variance = volatility ** 2 / TRADING_DAYS
+            idio_std[h] = np.sqrt(max(daily_variance - beta ** 2 * market_variance, 0.0))
+
+    # One draw for the whole (holdings x days) return matrix
+    returns = betas[:, None] * market_returns[None, :]
+    returns[:, 1:] += rng.standard_normal((len(profiles), days - 1)) * idio_std[:, None]
+    growth[:] = np.cumprod(1 + np.maximum(returns, -0.99), axis=1)
+
+    for h, (ticker, _, _) in enumerate(profiles):
+        if ticker:
+            real_growth = _aligned_growth(store, ticker, base_series.dates)
+            if real_growth is not None:
+                growth[h] = real_growth
+
+    return growth
+
+
+# Price stores opened by this process, keyed by directory
+_stores = {}
+
+
+def open_store(store_dir):
+    """Return this process's PriceStore for a directory, or None without one"""
+    if not store_dir:
+        return None
+    store = _stores.get(store_dir)
+    if store is None:
+        store = _stores[store_dir] = PriceStore(store_dir)
+    return store
+
+
+def simulate_portfolio_kernel(base_series, impact_idx, portfolio, seed, store_dir=None,
+                              strategies=PORTFOLIO_STRATEGIES):
+    """
+    Build the holding growth matrix and simulate every strategy on it.
+
+    A self-contained, picklable entry point so the work can run in a
+    separate process (see ComputePool).
+
+    Args:
+        base_series: MarketSeries with the event impact
+        impact_idx: Index of the event impact start
+        portfolio: Validated Portfolio
+        seed: Seed (or seed sequence entropy) for the per-holding returns
+        store_dir: Optional PriceStore directory with real per-ticker prices
+        strategies: Sequence of strategy names
+
+    Returns:
+        Tuple of (holding values (holdings, strategies, days), portfolio values (strategies, days),
+        portfolio time-weighted growth (strategies, days))
+    """
+    growth = holding_growth_matrix(base_series, portfolio.investments, generator(seed), open_store(store_dir))
+    return simulate_holdings(growth, impact_idx, portfolio.amounts, strategies)
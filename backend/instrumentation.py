@@ -0,0 +1,216 @@
+import bisect
+import cProfile
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Payload size buckets in bytes
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Holding count buckets
+HOLDING_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative histogram with optional labels, in the Prometheus bucket layout"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Per-bucket counts (plus +Inf), then the sum of observations
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', key + (_number(bound),), cumulative))
+            samples.append((f'{self.name}_sum', key, counts[-1]))
+            samples.append((f'{self.name}_count', key, cumulative))
+        return samples
+
+
+class CallbackGauge:
+    """Gauge or counter whose unlabelled value is read from a callback at scrape time"""
+
+    def __init__(self, name, help_text, callback, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.labelnames = ()
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self):
+        return [(self.name, (), self.callback())]
+
+
+class MetricsRegistry:
+    """A set of metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(self.prefix + name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help_text, labelnames, buckets))
+
+    def callback(self, name, help_text, callback, kind='gauge'):
+        return self._add(CallbackGauge(self.prefix + name, help_text, callback, kind))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, values, value in metric.samples():
+                labelnames = metric.labelnames + (('le',) if name.endswith('_bucket') else ())
+                lines.append(f'{name}{_label_text(labelnames, values)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = MetricsRegistry(prefix='marketconfidence_')
+
+span_seconds = registry.histogram(
+    'span_seconds', 'Time spent in each instrumented step of a request', ('span',)
+)
+
+
+@contextmanager
+def span(name):
+    """
+    Time a step of the current request.
+
+    The duration is recorded in the span histogram and, inside a request,
+    added to the request's span list (reported in its Server-Timing header).
+    Works outside requests too, e.g. in batch worker threads.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        span_seconds.observe(elapsed, span=name)
+        if has_app_context():
+            spans = g.setdefault('spans', [])
+            spans.append((name, elapsed))
+
+
+def server_timing(spans):
+    """Format (name, seconds) spans as a Server-Timing header value, summing repeated spans"""
+    totals = {}
+    for name, elapsed in spans:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ', '.join(f'{name};dur={elapsed * 1000:.2f}' for name, elapsed in totals.items())
+
+
+# cProfile can only run one profiler at a time, so profiled requests take turns
+_profile_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """cProfile session around one request, summarised as the top functions by cumulative time"""
+
+    def __init__(self, limit=25):
+        self.limit = limit
+        self._profile = None
+
+    def start(self):
+        """Start profiling; returns False if another request is being profiled"""
+        if not _profile_lock.acquire(blocking=False):
+            return False
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return True
+
+    def stop(self):
+        """Stop profiling and return the summary"""
+        if self._profile is None:
+            return None
+        self._profile.disable()
+        _profile_lock.release()
+        stats = pstats.Stats(self._profile)
+        total_time = stats.total_tt
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.limit]
+        self._profile = None
+        return {
+            'totalTime': round(total_time, 6),
+            'functions': [
+                {
+                    'function': f'{filename}:{line}({name})',
+                    'calls': calls,
+                    'totalTime': round(inline_time, 6),
+                    'cumulativeTime': round(cumulative_time, 6)
+                }
+                for (filename, line, name), (_, calls, inline_time, cumulative_time, _) in rows
+            ]
+        }
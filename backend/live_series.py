@@ -0,0 +1,189 @@
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from market_engine import MarketSeries, generate_market_series
+from seeding import generator, text_seed
+
+# Fields held by the ring buffer, in MarketSeries constructor order
+_FIELDS = ('dates', 'open', 'high', 'low', 'close', 'volume')
+
+# Mock walks start at 100 on this Monday and are drawn in blocks of BLOCK_DAYS
+# calendar days (a multiple of the 20-day trend period) counted from it
+MARKET_EPOCH = datetime(2000, 1, 3)
+BLOCK_DAYS = 60
+
+
+def market_seed(price_source):
+    """Default seed of the rolling market series of a price source"""
+    return text_seed('market-data', price_source.name)
+
+
+def market_window(price_source, seed, start_date, end_date):
+    """
+    Read the market series between two dates for a seed.
+
+    Mock prices are one walk from MARKET_EPOCH, with each block drawn from
+    its own stream seeded by the seed and the block's first day. The price
+    on a day therefore depends only on the seed and the date: every worker,
+    restart and later extension of a window sees the same walk. Other sources
+    get a stream seeded by the seed and start date for any mock fallback.
+
+    Returns:
+        MarketSeries of the business days in [start_date, end_date]
+    """
+    if price_source.name != 'mock':
+        return price_source.market_series(start_date, end_date, generator(text_seed(seed, start_date.date())))
+
+    first = np.datetime64(start_date.date(), 'D')
+    last = np.datetime64(end_date.date(), 'D')
+    pieces = []
+    level = 100.0
+    offset = 0
+    block_start = MARKET_EPOCH
+    while block_start.date() <= end_date.date():
+        block_end = block_start + timedelta(days=BLOCK_DAYS - 1)
+        block = generate_market_series(
+            block_start, block_end, generator(text_seed(seed, block_start.date())), calendar_offset=offset
+        )
+        # Each block starts from 100; scale it to continue from the previous block's last close
+        scale = level / 100.0
+        keep = (block.dates >= first) & (block.dates <= last)
+        if keep.any():
+            pieces.append(MarketSeries(
+                block.dates[keep],
+                block.open[keep] * scale,
+                block.high[keep] * scale,
+                block.low[keep] * scale,
+                block.close[keep] * scale,
+                block.volume[keep]
+            ))
+        if len(block):
+            level = block.close[-1] * scale
+        block_start = block_end + timedelta(days=1)
+        offset += BLOCK_DAYS
+    if not pieces:
+        empty = np.empty(0)
+        return MarketSeries(np.empty(0, dtype='datetime64[D]'), empty, empty, empty, empty, np.empty(0, dtype=np.int64))
+    return MarketSeries(*(np.concatenate([getattr(piece, name) for piece in pieces]) for name in _FIELDS))
+
+
+class RollingMarketSeries:
+    """
+    Persistent market series over a rolling window, extended in place.
+
+    Rows live in a fixed-size ring buffer sized for the window, so appending
+    new days overwrites the oldest ones without reallocating. New days are
+    read from the price source only when the calendar moves past the last
+    stored day. Rows come from market_window with one seed, so the series is
+    the same in every worker. Clients can then fetch only the rows after a
+    date they have seen.
+    """
+
+    def __init__(self, price_source, window_days=5 * 365, seed=None):
+        self.price_source = price_source
+        self.window_days = window_days
+        self.seed = market_seed(price_source) if seed is None else seed
+        # At most 5 business days per 7 calendar days fall inside the window
+        self.capacity = window_days * 5 // 7 + 8
+        self._buffers = {
+            'dates': np.empty(self.capacity, dtype='datetime64[D]'),
+            'open': np.empty(self.capacity),
+            'high': np.empty(self.capacity),
+            'low': np.empty(self.capacity),
+            'close': np.empty(self.capacity),
+            'volume': np.empty(self.capacity, dtype=np.int64)
+        }
+        self._start = 0
+        self._size = 0
+        self._last_checked = None
+        self._etag = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _positions(self, offset=0):
+        """Ring positions of the stored rows from offset onwards, oldest first"""
+        return (self._start + np.arange(offset, self._size)) % self.capacity
+
+    def _append(self, series):
+        n = len(series)
+        if n == 0:
+            return
+        if n > self.capacity:
+            series = MarketSeries(*(getattr(series, name)[-self.capacity:] for name in _FIELDS))
+            n = self.capacity
+        positions = (self._start + self._size + np.arange(n)) % self.capacity
+        for name in _FIELDS:
+            self._buffers[name][positions] = getattr(series, name)
+        overflow = max(self._size + n - self.capacity, 0)
+        self._start = (self._start + overflow) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    def _evict_before(self, first_date):
+        dates = self._buffers['dates'][self._positions()]
+        drop = int(np.searchsorted(dates, first_date, side='left'))
+        self._start = (self._start + drop) % self.capacity
+        self._size -= drop
+
+    def refresh(self, now=None):
+        """Extend the series up to today and drop rows that left the window"""
+        now = now or datetime.now()
+        today = now.date()
+        with self._lock:
+            if self._last_checked == today:
+                return
+            window_start = now - timedelta(days=self.window_days)
+            if self._size == 0:
+                self._append(market_window(self.price_source, self.seed, window_start, now))
+            else:
+                last_date = self._buffers['dates'][(self._start + self._size - 1) % self.capacity]
+                next_date = last_date.astype(datetime) + timedelta(days=1)
+                if next_date <= today:
+                    self._append(
+                        market_window(self.price_source, self.seed, datetime.combine(next_date, datetime.min.time()), now)
+                    )
+            self._evict_before(np.datetime64(window_start.date(), 'D'))
+            self._last_checked = today
+            self._etag = None
+
+    def etag(self):
+        """
+        Entity tag identifying the current window contents.
+
+        It is a hash of every stored row, so two series only share a tag when
+        they hold the same data, whichever worker or seed produced them.
+        """
+        with self._lock:
+            if self._etag is None:
+                positions = self._positions()
+                digest = hashlib.blake2b(digest_size=16)
+                for name in _FIELDS:
+                    digest.update(np.ascontiguousarray(self._buffers[name][positions]).tobytes())
+                self._etag = digest.hexdigest()
+            return self._etag
+
+    def cursor(self):
+        """Date of the newest row, for clients to pass back as since=<date>"""
+        with self._lock:
+            if self._size == 0:
+                return None
+            return str(self._buffers['dates'][(self._start + self._size - 1) % self.capacity])
+
+    def since(self, since_date=None):
+        """
+        Return the rows after since_date (all rows if None) as a new MarketSeries.
+
+        Returns:
+            MarketSeries, empty if nothing was appended after since_date
+        """
+        with self._lock:
+            offset = 0
+            if since_date is not None:
+                dates = self._buffers['dates'][self._positions()]
+                offset = int(np.searchsorted(dates, np.datetime64(since_date, 'D'), side='right'))
+            positions = self._positions(offset)
+            return MarketSeries(*(self._buffers[name][positions] for name in _FIELDS))
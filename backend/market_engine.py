@@ -0,0 +1,306 @@
+import numpy as np
+from dataclasses import dataclass, field
+
+from seeding import PATH_BLOCK, path_blocks
+
+# Fields carried by every market series, in the order they are serialized
+PRICE_FIELDS = ('close', 'open', 'high', 'low')
+
+
+@dataclass
+class MarketSeries:
+    """Columnar OHLCV series: one datetime64[D] axis plus one array per field"""
+    dates: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    _date_strings: list = field(default=None, init=False, repr=False, compare=False)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def freeze(self):
+        """Mark every array read-only so the series can be shared between results"""
+        for array in (self.dates, self.open, self.high, self.low, self.close, self.volume):
+            array.flags.writeable = False
+        return self
+
+    def take(self, indices):
+        """Return the given rows as a new series"""
+        return MarketSeries(
+            self.dates[indices],
+            self.open[indices],
+            self.high[indices],
+            self.low[indices],
+            self.close[indices],
+            self.volume[indices]
+        )
+
+    def date_strings(self):
+        """Return the date axis as a list of 'YYYY-MM-DD' strings"""
+        if self._date_strings is None or len(self._date_strings) != len(self.dates):
+            self._date_strings = np.datetime_as_string(self.dates, unit='D').tolist()
+        return self._date_strings
+
+    def columns(self):
+        """Return the series as a mapping of field name to array, prices rounded to cents"""
+        columns = {'date': self.dates}
+        for name in PRICE_FIELDS:
+            columns[name] = np.round(getattr(self, name), 2)
+        columns['volume'] = self.volume
+        return columns
+
+    def iter_records(self, extra=None, chunk_size=1024):
+        """
+        Lazily yield rows in the list-of-dicts shape served by the API.
+
+        Rows are converted one chunk at a time, so only chunk_size dicts are
+        alive at once when the caller streams them.
+
+        Args:
+            extra: Optional mapping of additional column name to array merged into each row
+            chunk_size: Number of rows converted per step
+        """
+        dates = self.date_strings()
+        extra = {key: np.asarray(values) for key, values in (extra or {}).items()}
+        for start in range(0, len(self), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            columns = {
+                'date': dates[chunk],
+                'close': np.round(self.close[chunk], 2).tolist(),
+                'open': np.round(self.open[chunk], 2).tolist(),
+                'high': np.round(self.high[chunk], 2).tolist(),
+                'low': np.round(self.low[chunk], 2).tolist(),
+                'volume': self.volume[chunk].tolist()
+            }
+            for key, values in extra.items():
+                columns[key] = values[chunk].tolist()
+            names = list(columns)
+            for row in zip(*columns.values()):
+                yield dict(zip(names, row))
+
+    def to_records(self, extra=None):
+        """
+        Convert to the list-of-dicts shape served by the API.
+
+        Args:
+            extra: Optional mapping of additional column name to array merged into each row
+        """
+        return list(self.iter_records(extra, chunk_size=max(len(self), 1)))
+
+
+def _calendar(start_date, end_date):
+    """
+    Build the daily calendar between two dates (inclusive).
+
+    Returns:
+        Tuple of (datetime64[D] dates, calendar index of each date, weekday mask)
+    """
+    start = np.datetime64(start_date.date() if hasattr(start_date, 'date') else start_date, 'D')
+    days = (end_date - start_date).days + 1
+    dates = start + np.arange(max(days, 0))
+    # 1970-01-01 was a Thursday, so (days since epoch + 3) % 7 gives Monday=0 .. Sunday=6
+    weekday = (dates.astype(np.int64) + 3) % 7
+    return dates, np.arange(len(dates)), weekday < 5
+
+
+def business_days(start_date, end_date):
+    """
+    Build the business-day calendar between two dates (inclusive).
+
+    Returns:
+        Tuple of (datetime64[D] dates, calendar day index of each date)
+    """
+    dates, calendar_idx, weekdays = _calendar(start_date, end_date)
+    return dates[weekdays], calendar_idx[weekdays]
+
+
+def generate_close_paths(calendar_idx, n_paths, rng):
+    """
+    Generate mock close prices for many independent paths at once.
+
+    Each day applies a uniform +/-2% change, with an extra +/-5% trend shift
+    every 20 calendar days, compounded from a starting price of 100.
+
+    Args:
+        calendar_idx: Calendar day index of each business day
+        n_paths: Number of paths to generate
+        rng: numpy Generator used for the random draws
+
+    Returns:
+        Array of shape (n_paths, days)
+    """
+    n = len(calendar_idx)
+    growth = 1 + rng.uniform(-0.02, 0.02, (n_paths, n))
+    trend_days = (calendar_idx > 0) & (calendar_idx % 20 == 0)
+    growth[:, trend_days] *= 1 + rng.uniform(-0.05, 0.05, (n_paths, int(trend_days.sum())))
+    return 100.0 * np.cumprod(growth, axis=1)
+
+
+def generate_market_series(start_date, end_date, rng, calendar_offset=0):
+    """
+    Generate a mock OHLCV series for a time period in a single vectorized pass.
+
+    Statistically equivalent to the original per-day loop: a uniform +/-2% daily
+    change, a +/-5% trend shift every 20 calendar days, and open/high/low/volume
+    drawn around the close.
+
+    Args:
+        start_date: First calendar date of the series
+        end_date: Last calendar date of the series
+        rng: numpy Generator used for all random draws
+        calendar_offset: Calendar day index of start_date, so trend shifts line
+            up when a long series is generated in consecutive pieces
+
+    Returns:
+        MarketSeries covering the business days in the period
+    """
+    dates, calendar_idx = business_days(start_date, end_date)
+    calendar_idx = calendar_idx + calendar_offset
+    n = len(dates)
+
+    close = generate_close_paths(calendar_idx, 1, rng)[0]
+    open_ = close * rng.uniform(0.99, 1.01, n)
+    high = np.maximum(open_, close) * rng.uniform(1.001, 1.01, n)
+    low = np.minimum(open_, close) * rng.uniform(0.99, 0.999, n)
+    volume = rng.uniform(100000, 1000000, n).astype(np.int64)
+
+    return MarketSeries(dates, open_, high, low, close, volume)
+
+
+def find_impact_index(dates, impact_date):
+    """Return the index of the first trading day on or after impact_date (0 if none)"""
+    impact = np.datetime64(impact_date.date() if hasattr(impact_date, 'date') else impact_date, 'D')
+    idx = int(np.searchsorted(dates, impact, side='left'))
+    return idx if idx < len(dates) else 0
+
+
+def event_impact_shape(severity):
+    """Return (impact_factor, recovery_days) for an event severity"""
+    impact_factor = max(0.05, min(0.40, severity))  # Limit between 5% and 40%
+    recovery_days = int(severity * 100)  # More severe = longer recovery
+    return impact_factor, recovery_days
+
+
+def apply_event_impact_paths(close, impact_idx, severity):
+    """
+    Apply a crash and gradual recovery to the close prices of many paths in place.
+
+    Args:
+        close: Array of shape (paths, days)
+        impact_idx: Index of the event impact start
+        severity: Fractional decline of the event
+
+    Returns:
+        Tuple of (drop factor per crash day, crash slice, recovery slice, recovery_days)
+    """
+    n = close.shape[1]
+    impact_factor, recovery_days = event_impact_shape(severity)
+
+    # Market crash: a drop that tapers linearly over 10 days
+    crash = slice(impact_idx, min(impact_idx + 10, n))
+    drop_factor = impact_factor * (10 - np.arange(crash.stop - crash.start)) / 10
+    close[:, crash] *= 1 - drop_factor
+
+    # Recovery: close the gap between the pre- and post-crash prices
+    pre_crash_price = close[:, impact_idx - 1] if impact_idx > 0 else close[:, 0]
+    post_crash_price = close[:, min(impact_idx + 9, n - 1)]
+    price_gap = pre_crash_price - post_crash_price
+
+    recovery = slice(min(impact_idx + 10, n), min(impact_idx + 10 + recovery_days, n))
+    m = recovery.stop - recovery.start
+    if m > 0:
+        recovery_progress = np.arange(m) / recovery_days
+        recovery_factor = np.minimum(1.0, recovery_progress * 1.5)  # Can accelerate recovery a bit
+        close[:, recovery] = post_crash_price[:, None] + price_gap[:, None] * recovery_factor
+
+    return drop_factor, crash, recovery, recovery_days
+
+
+def apply_event_impact(series, impact_idx, severity, rng):
+    """
+    Apply a crash and gradual recovery to a series in place.
+
+    Args:
+        series: MarketSeries to modify
+        impact_idx: Index of the event impact start
+        severity: Fractional decline of the event
+        rng: numpy Generator used for the recovery noise
+
+    Returns:
+        Number of recovery days used for the event
+    """
+    if len(series) == 0:
+        return event_impact_shape(severity)[1]
+
+    drop_factor, crash, recovery, recovery_days = apply_event_impact_paths(
+        series.close[None, :], impact_idx, severity
+    )
+
+    # Open/high/low follow the crash; volume is higher during it
+    for name in ('open', 'high', 'low'):
+        getattr(series, name)[crash] *= 1 - drop_factor
+    series.volume[crash] = (series.volume[crash] * (1 + drop_factor * 5)).astype(np.int64)
+
+    # During the recovery, open/high/low are drawn around the recovered close
+    m = recovery.stop - recovery.start
+    if m > 0:
+        close = series.close[recovery]
+        series.open[recovery] = close * rng.uniform(0.99, 1.01, m)
+        series.high[recovery] = close * rng.uniform(1.0, 1.02, m)
+        series.low[recovery] = close * rng.uniform(0.98, 1.0, m)
+
+    # Round all the price values
+    for name in PRICE_FIELDS:
+        np.round(getattr(series, name), 2, out=getattr(series, name))
+
+    return recovery_days
+
+
+def generate_event_impact_series(start_date, end_date, impact_date, severity, rng):
+    """
+    Generate a mock series with an event impact.
+
+    Args:
+        rng: numpy Generator used for all random draws
+
+    Returns:
+        Tuple of (MarketSeries, recovery_days, impact_idx)
+    """
+    series = generate_market_series(start_date, end_date, rng)
+    impact_idx = find_impact_index(series.dates, impact_date)
+    recovery_days = apply_event_impact(series, impact_idx, severity, rng)
+    return series, recovery_days, impact_idx
+
+
+def generate_event_impact_paths(start_date, end_date, impact_date, severity, n_paths, seed):
+    """
+    Generate close prices with an event impact for many paths at once.
+
+    Paths are drawn in blocks from independent streams spawned from the seed.
+    Every block draws its full size and is trimmed afterwards, so a path does
+    not depend on how many paths are requested.
+
+    Args:
+        start_date: First date of the window
+        end_date: Last date of the window
+        impact_date: Date of the event impact
+        severity: Fractional decline of the event
+        n_paths: Number of paths to generate
+        seed: Seed of the path streams (see seeding.path_blocks)
+
+    Returns:
+        Tuple of (datetime64[D] dates, close array of shape (n_paths, days), recovery_days, impact_idx)
+    """
+    dates, calendar_idx = business_days(start_date, end_date)
+    blocks = path_blocks(seed, n_paths)
+    close = np.concatenate(
+        [generate_close_paths(calendar_idx, PATH_BLOCK, rng)[:count] for count, rng in blocks]
+    ) if blocks else np.empty((0, len(dates)))
+    impact_idx = find_impact_index(dates, impact_date)
+    if len(dates) == 0:
+        return dates, close, event_impact_shape(severity)[1], impact_idx
+    _, _, _, recovery_days = apply_event_impact_paths(close, impact_idx, severity)
+    return dates, close, recovery_days, impact_idx
@@ -0,0 +1,454 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from holdings import holding_ticker
+from simulation import CASH_FLOW_FRACTION, PORTFOLIO_STRATEGIES, TRADE_OFFSET, builtin_strategy
+from monte_carlo import DEFAULT_PERCENTILES
+from downsampling import DOWNSAMPLE_METHODS, MIN_POINTS
+from seeding import MAX_SEED
+from strategy_dsl import ANCHORS, RULE_TYPES, StrategySpec
+
+# Longest event description accepted; the matcher scans the whole text
+MAX_EVENT_LENGTH = 500
+
+# Longest strategy name accepted
+MAX_STRATEGY_NAME_LENGTH = 64
+
+# Largest rule offset, period or count in trading days (about 400 years), and the largest
+# amount a rule may invest, as a multiple of the initial investment
+MAX_RULE_DAYS = 100000
+MAX_RULE_AMOUNT = 100
+
+# Largest market beta (either sign) and annualized volatility a holding may declare
+MAX_HOLDING_BETA = 10
+MAX_HOLDING_VOLATILITY = 5
+
+# Paths simulated when a Monte Carlo request does not say, and the most percentiles it may ask for
+DEFAULT_MONTE_CARLO_PATHS = 1000
+MAX_PERCENTILES = 100
+
+
+class ValidationError(ValueError):
+    """Raised when a request payload is invalid; the message is safe to return to the client"""
+
+
+def _number(value, field_name, minimum=None, maximum=None):
+    """Parse a finite number (JSON number or numeric string)"""
+    if isinstance(value, bool):
+        raise ValidationError(f"{field_name} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{field_name} must be a number")
+    if not math.isfinite(number):
+        raise ValidationError(f"{field_name} must be a finite number")
+    if minimum is not None and number < minimum:
+        raise ValidationError(f"{field_name} must be at least {minimum}")
+    if maximum is not None and number > maximum:
+        raise ValidationError(f"{field_name} must be at most {maximum}")
+    return number
+
+
+def _integer(value, field_name, minimum=None, maximum=None):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValidationError(f"{field_name} must be an integer")
+    if minimum is not None and value < minimum:
+        raise ValidationError(f"{field_name} must be at least {minimum}")
+    if maximum is not None and value > maximum:
+        raise ValidationError(f"{field_name} must be at most {maximum}")
+    return value
+
+
+def _rule_amount(rule, where):
+    return _number(rule.get('amount'), f"{where}.amount", minimum=0, maximum=MAX_RULE_AMOUNT)
+
+
+def _fraction(value, field_name):
+    """Parse a number strictly between 0 and 1"""
+    number = _number(value, field_name)
+    if not 0 < number < 1:
+        raise ValidationError(f"{field_name} must be between 0 and 1")
+    return number
+
+
+def _identifier(value, field_name):
+    if isinstance(value, bool) or not isinstance(value, (str, int)) or value == '':
+        raise ValidationError(f"{field_name} must be a string or integer")
+    return value
+
+
+@dataclass
+class Investment:
+    """One validated holding of a custom portfolio"""
+    __slots__ = ('id', 'name', 'amount', 'ticker', 'beta', 'volatility')
+    id: object
+    name: str
+    amount: float
+    ticker: object
+    beta: object
+    volatility: object
+
+    @classmethod
+    def from_dict(cls, data, index=0):
+        """
+        Validate an investment object from a request.
+
+        Args:
+            data: Dictionary with 'id', 'name' and 'amount', and optional
+                'ticker', 'beta' and 'volatility'
+            index: Position in the request, used in error messages
+
+        Returns:
+            Investment with a numeric amount and the ticker resolved from the name if not given
+        """
+        where = f"investments[{index}]"
+        if not isinstance(data, dict):
+            raise ValidationError(f"{where} must be an object")
+        for required in ('id', 'name', 'amount'):
+            if required not in data:
+                raise ValidationError(f"{where}.{required} is required")
+        if not isinstance(data['name'], str):
+            raise ValidationError(f"{where}.name must be a string")
+        if data.get('ticker') is not None and not isinstance(data['ticker'], str):
+            raise ValidationError(f"{where}.ticker must be a string")
+        beta = data.get('beta')
+        volatility = data.get('volatility')
+        return cls(
+            id=_identifier(data['id'], f"{where}.id"),
+            name=data['name'],
+            amount=_number(data['amount'], f"{where}.amount", minimum=0),
+            ticker=holding_ticker(data),
+            beta=None if beta is None else _number(
+                beta, f"{where}.beta", minimum=-MAX_HOLDING_BETA, maximum=MAX_HOLDING_BETA
+            ),
+            volatility=None if volatility is None else _number(
+                volatility, f"{where}.volatility", minimum=0, maximum=MAX_HOLDING_VOLATILITY
+            )
+        )
+
+
+@dataclass(eq=False)
+class Portfolio:
+    """
+    A validated portfolio: its holdings plus their amounts as one float64 array.
+
+    An empty portfolio stands for the default index portfolio.
+    """
+    __slots__ = ('id', 'investments', 'amounts')
+    id: object
+    investments: tuple
+    amounts: np.ndarray
+
+    @classmethod
+    def from_investments(cls, investments, portfolio_id=None):
+        investments = tuple(investments)
+        amounts = np.array([investment.amount for investment in investments], dtype=np.float64)
+        return cls(portfolio_id, investments, amounts)
+
+    def __len__(self):
+        return len(self.investments)
+
+    @property
+    def total(self):
+        return float(self.amounts.sum())
+
+
+def parse_body(data):
+    """Return the parsed JSON body of a request; a missing body is empty and anything but an object is invalid"""
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise ValidationError("request body must be a JSON object")
+    return data
+
+
+def parse_event(data):
+    """Return the validated event description of a request body"""
+    event = data.get('event')
+    if not event:
+        raise ValidationError("Event description is required")
+    if not isinstance(event, str):
+        raise ValidationError("event must be a string")
+    if len(event) > MAX_EVENT_LENGTH:
+        raise ValidationError(f"event must be at most {MAX_EVENT_LENGTH} characters")
+    return event
+
+
+def parse_seed(data):
+    """Return the optional random seed of a request body, or None"""
+    seed = data.get('seed')
+    if seed is None:
+        return None
+    if isinstance(seed, bool) or not isinstance(seed, int) or not 0 <= seed <= MAX_SEED:
+        raise ValidationError(f"seed must be an integer between 0 and {MAX_SEED}")
+    return seed
+
+
+def parse_seed_arg(args):
+    """Return the optional ?seed= query argument, or None"""
+    seed = args.get('seed')
+    if seed is None:
+        return None
+    try:
+        seed = int(seed)
+    except ValueError:
+        raise ValidationError(f"seed must be an integer between 0 and {MAX_SEED}")
+    return parse_seed({'seed': seed})
+
+
+def parse_lod(args, methods=DOWNSAMPLE_METHODS):
+    """
+    Validate the ?points= and ?downsample= query arguments.
+
+    Returns:
+        Tuple of (point count or None for full detail, downsampling method)
+    """
+    method = args.get('downsample', methods[0])
+    if method not in methods:
+        raise ValidationError(f"downsample must be one of: {', '.join(methods)}")
+    points = args.get('points')
+    if points is None:
+        return None, method
+    try:
+        points = int(points)
+    except ValueError:
+        raise ValidationError("points must be an integer")
+    if points < MIN_POINTS:
+        raise ValidationError(f"points must be at least {MIN_POINTS}")
+    return points, method
+
+
+def parse_portfolio(data, max_holdings, portfolio_id=None):
+    """
+    Validate the 'investments' and 'selectedInvestments' of a request body.
+
+    Only the selected investments make up the portfolio. With no investments
+    or no selection the portfolio is empty (the default index portfolio).
+
+    Returns:
+        Portfolio
+    """
+    investments = data.get('investments') or []
+    selected = data.get('selectedInvestments') or []
+    if not isinstance(investments, list):
+        raise ValidationError("investments must be a list")
+    if not isinstance(selected, list):
+        raise ValidationError("selectedInvestments must be a list")
+    if not investments or not selected:
+        return Portfolio.from_investments((), portfolio_id)
+
+    selected_ids = set()
+    for i, investment_id in enumerate(selected):
+        selected_ids.add(_identifier(investment_id, f"selectedInvestments[{i}]"))
+
+    chosen = []
+    seen_ids = set()
+    for index, item in enumerate(investments):
+        if not isinstance(item, dict):
+            raise ValidationError(f"investments[{index}] must be an object")
+        if _identifier(item.get('id'), f"investments[{index}].id") not in selected_ids:
+            continue
+        investment = Investment.from_dict(item, index)
+        if investment.id in seen_ids:
+            raise ValidationError(f"investments[{index}].id {investment.id!r} is used more than once")
+        seen_ids.add(investment.id)
+        chosen.append(investment)
+
+    if len(chosen) > max_holdings:
+        raise ValidationError(f"A portfolio may hold at most {max_holdings} investments")
+
+    portfolio = Portfolio.from_investments(chosen, portfolio_id)
+    if chosen and portfolio.total <= 0:
+        raise ValidationError("Total investment amount must be greater than zero")
+    return portfolio
+
+
+def parse_batch(data, max_items, max_holdings):
+    """
+    Validate a batch request body.
+
+    Returns:
+        Tuple of (list of event descriptions, list of Portfolio)
+    """
+    events = data.get('events')
+    portfolios = data.get('portfolios') or [{}]
+    if not isinstance(events, list) or not events:
+        raise ValidationError("events must be a non-empty list of event descriptions")
+    if not isinstance(portfolios, list):
+        raise ValidationError("portfolios must be a list of objects")
+    if len(events) * len(portfolios) > max_items:
+        raise ValidationError(f"A batch may hold at most {max_items} event/portfolio combinations")
+
+    events = [parse_event({'event': event}) for event in events]
+    parsed = []
+    for p, portfolio in enumerate(portfolios):
+        if not isinstance(portfolio, dict):
+            raise ValidationError(f"portfolios[{p}] must be an object")
+        try:
+            parsed.append(parse_portfolio(portfolio, max_holdings, portfolio.get('id', p)))
+        except ValidationError as e:
+            raise ValidationError(f"portfolios[{p}]: {e}")
+    return events, parsed
+
+
+def _rule_timing(rule, where):
+    anchor = rule.get('at', 'impact')
+    if anchor not in ANCHORS:
+        raise ValidationError(f"{where}.at must be one of {', '.join(ANCHORS)}")
+    return anchor, _integer(rule.get('offset', 0), f"{where}.offset", minimum=-MAX_RULE_DAYS, maximum=MAX_RULE_DAYS)
+
+
+def parse_strategy(data, index=0):
+    """
+    Validate one strategy: a built-in name or a spec object.
+
+    A spec looks like {"name": "dca", "rules": [{"type": "contribute", "amount": 0.05, "every": 21}]};
+    see strategy_dsl for the rule types and their fields.
+
+    Returns:
+        StrategySpec
+    """
+    where = f"strategies[{index}]"
+    if isinstance(data, str):
+        if data not in PORTFOLIO_STRATEGIES:
+            raise ValidationError(f"{where} must be one of {', '.join(PORTFOLIO_STRATEGIES)} or a strategy object")
+        return builtin_strategy(data)
+    if not isinstance(data, dict):
+        raise ValidationError(f"{where} must be a strategy name or object")
+
+    name = data.get('name')
+    if not isinstance(name, str) or not name or len(name) > MAX_STRATEGY_NAME_LENGTH:
+        raise ValidationError(f"{where}.name must be a string of 1 to {MAX_STRATEGY_NAME_LENGTH} characters")
+    rules = data.get('rules', [])
+    if not isinstance(rules, list):
+        raise ValidationError(f"{where}.rules must be a list")
+
+    grouped = {'adds': [], 'withdrawals': [], 'buys': [], 'contributions': [], 'dips': []}
+    stop_loss = rebalance = None
+    for r, rule in enumerate(rules):
+        rule_where = f"{where}.rules[{r}]"
+        if not isinstance(rule, dict) or rule.get('type') not in RULE_TYPES:
+            raise ValidationError(f"{rule_where}.type must be one of {', '.join(RULE_TYPES)}")
+        rule_type = rule['type']
+        if rule_type == 'add':
+            grouped['adds'].append(
+                _rule_timing(rule, rule_where) + (_rule_amount(rule, rule_where),)
+            )
+        elif rule_type == 'withdraw':
+            grouped['withdrawals'].append(
+                _rule_timing(rule, rule_where) + (_fraction(rule.get('fraction'), f"{rule_where}.fraction"),)
+            )
+        elif rule_type == 'buy':
+            grouped['buys'].append(_rule_timing(rule, rule_where) + (
+                _number(rule.get('fraction'), f"{rule_where}.fraction", minimum=0, maximum=MAX_RULE_AMOUNT),
+            ))
+        elif rule_type == 'contribute':
+            count = rule.get('count')
+            grouped['contributions'].append(_rule_timing(rule, rule_where) + (
+                _rule_amount(rule, rule_where),
+                _integer(rule.get('every'), f"{rule_where}.every", minimum=1, maximum=MAX_RULE_DAYS),
+                None if count is None else _integer(count, f"{rule_where}.count", minimum=1, maximum=MAX_RULE_DAYS)
+            ))
+        elif rule_type == 'buy_the_dip':
+            grouped['dips'].append((
+                _fraction(rule.get('drawdown'), f"{rule_where}.drawdown"),
+                _rule_amount(rule, rule_where)
+            ))
+        elif rule_type == 'stop_loss':
+            if stop_loss is not None:
+                raise ValidationError(f"{where} may have only one stop_loss rule")
+            reenter = rule.get('reenter', False)
+            if not isinstance(reenter, bool):
+                raise ValidationError(f"{rule_where}.reenter must be true or false")
+            stop_loss = (_fraction(rule.get('trail'), f"{rule_where}.trail"), reenter)
+        else:
+            if rebalance is not None:
+                raise ValidationError(f"{where} may have only one rebalance rule")
+            threshold = _fraction(rule.get('threshold'), f"{rule_where}.threshold")
+            if threshold < 0.01:
+                raise ValidationError(f"{rule_where}.threshold must be at least 0.01")
+            rebalance = (_fraction(rule.get('target'), f"{rule_where}.target"), threshold)
+
+    if stop_loss and rebalance:
+        raise ValidationError(f"{where} cannot combine stop_loss and rebalance rules")
+    return StrategySpec(
+        name,
+        adds=tuple(grouped['adds']),
+        withdrawals=tuple(grouped['withdrawals']),
+        buys=tuple(grouped['buys']),
+        contributions=tuple(grouped['contributions']),
+        dips=tuple(grouped['dips']),
+        stop_loss=stop_loss,
+        rebalance=rebalance
+    )
+
+
+def parse_strategies(data, max_strategies):
+    """
+    Validate the optional 'strategies' list of a request body.
+
+    Returns:
+        Tuple of StrategySpec, or None when the request did not ask for specific strategies
+    """
+    strategies = data.get('strategies')
+    if strategies is None:
+        return None
+    if not isinstance(strategies, list) or not strategies:
+        raise ValidationError("strategies must be a non-empty list")
+    if len(strategies) > max_strategies:
+        raise ValidationError(f"At most {max_strategies} strategies may be compared at once")
+    specs = tuple(parse_strategy(strategy, index) for index, strategy in enumerate(strategies))
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValidationError("strategy names must be unique")
+    return specs
+
+
+def _number_list(data, field_name, parse_item, default, max_length):
+    values = data.get(field_name)
+    if values is None:
+        return default
+    if not isinstance(values, list) or not values:
+        raise ValidationError(f"{field_name} must be a non-empty list")
+    if len(values) > max_length:
+        raise ValidationError(f"{field_name} may hold at most {max_length} values")
+    return [parse_item(value, f"{field_name}[{i}]") for i, value in enumerate(values)]
+
+
+def parse_sweep(data, default_severity, max_severities, max_axis_length):
+    """
+    Validate the grid of a sensitivity sweep request.
+
+    'severities' defaults to the matched event's severity, 'offsets' (trading
+    days from the impact) to the midpoint trade five days in, and 'cashFlows'
+    to the fraction traded by the built-in strategies.
+
+    Returns:
+        Tuple of (severities, offsets, cash_flows, per_holding)
+    """
+    severities = _number_list(data, 'severities', _fraction, [default_severity], max_severities)
+    offsets = _number_list(data, 'offsets', _integer, [TRADE_OFFSET], max_axis_length)
+    cash_flows = _number_list(data, 'cashFlows', _fraction, [CASH_FLOW_FRACTION], max_axis_length)
+    per_holding = data.get('perHolding', False)
+    if not isinstance(per_holding, bool):
+        raise ValidationError("perHolding must be true or false")
+    return severities, offsets, cash_flows, per_holding
+
+
+def _percentile(value, field_name):
+    number = _number(value, field_name, minimum=0, maximum=100)
+    return int(number) if number.is_integer() else number
+
+
+def parse_monte_carlo(data, max_paths):
+    """
+    Validate the 'paths' and 'percentiles' of a Monte Carlo request body.
+
+    Returns:
+        Tuple of (path count, list of percentiles between 0 and 100)
+    """
+    n_paths = _integer(data.get('paths', DEFAULT_MONTE_CARLO_PATHS), 'paths', minimum=1, maximum=max_paths)
+    percentiles = _number_list(data, 'percentiles', _percentile, list(DEFAULT_PERCENTILES), MAX_PERCENTILES)
+    return n_paths, percentiles
@@ -0,0 +1,102 @@
+import numpy as np
+
+from market_engine import generate_event_impact_paths
+from simulation import CASH_FLOW_FRACTION, resolve_strategies, trade_cash, unit_multipliers
+
+# Strategies compared by the Monte Carlo engine, matching /api/simulate-strategies
+MONTE_CARLO_STRATEGIES = ('hold', 'withdraw', 'add')
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def strategy_unit_multipliers(days, impact_idx, strategies=MONTE_CARLO_STRATEGIES,
+                              cash_flow=CASH_FLOW_FRACTION):
+    """
+    Units held on each day per strategy, relative to the initial units.
+
+    Built from the same StrategySpecs as /api/simulate-strategies (see
+    simulation.builtin_strategy).
+
+    Returns:
+        Array of shape (strategies, days)
+    """
+    return unit_multipliers(resolve_strategies(strategies, cash_flow), days, impact_idx)
+
+
+def run_monte_carlo(start_date, end_date, impact_date, severity, n_paths, seed,
+                    percentiles=DEFAULT_PERCENTILES, initial_units=100,
+                    strategies=MONTE_CARLO_STRATEGIES, cash_flow=CASH_FLOW_FRACTION):
+    """
+    Simulate the hold/withdraw/add strategies over many random event paths.
+
+    The strategies are the built-in specs of /api/simulate-strategies, so
+    they make the same trades. Winners are decided on return on capital
+    deployed: the gain in wealth (the portfolio value plus cash withdrawn
+    minus cash added) over the initial investment plus any cash added. On
+    wealth alone add and withdraw mirror each other around hold, so one of
+    them always wins; per unit of capital, holding wins when buying more
+    would have earned less than the position already did.
+
+    Args:
+        start_date: First date of the window
+        end_date: Last date of the window
+        impact_date: Date of the event impact
+        severity: Fractional decline of the event
+        n_paths: Number of paths to simulate
+        seed: Seed of the path streams; the same seed gives the same paths
+        percentiles: Percentiles reported for the value bands
+        initial_units: Units held at the start of every path
+        strategies: Built-in strategy names to compare
+        cash_flow: Fraction of the position sold or bought
+
+    Returns:
+        Dictionary with the date axis, per-strategy percentile bands, win
+        probabilities, and the expected final values, wealth and return on capital
+    """
+    dates, close, recovery_days, impact_idx = generate_event_impact_paths(
+        start_date, end_date, impact_date, severity, n_paths, seed
+    )
+    days = close.shape[1]
+    multipliers = strategy_unit_multipliers(days, impact_idx, strategies, cash_flow)
+    units = initial_units * multipliers
+
+    # Units per strategy are the same on every path, so value quantiles are
+    # the close quantiles scaled by the units held that day
+    close_bands = np.percentile(close, percentiles, axis=0)
+    bands = {
+        strategy: {f'p{p}': units[s] * close_bands[i] for i, p in enumerate(percentiles)}
+        for s, strategy in enumerate(strategies)
+    }
+
+    # Final portfolio value, wealth (value plus net cash taken out) and return
+    # on the capital put in, per strategy and path
+    paid, received = trade_cash(multipliers, close)
+    final_values = units[:, -1, None] * close[None, :, -1]
+    wealth = final_values + initial_units * (received - paid).T
+    initial_values = initial_units * close[:, 0]
+    return_on_capital = (wealth - initial_values) / (initial_values + initial_units * paid.T)
+
+    winners = np.argmax(return_on_capital, axis=0)
+    win_counts = np.bincount(winners, minlength=len(strategies))
+
+    return {
+        'dates': dates,
+        'paths': n_paths,
+        'impactIndex': impact_idx,
+        'recoveryDays': recovery_days,
+        'percentiles': list(percentiles),
+        'bands': bands,
+        'probabilityBest': {
+            strategy: round(float(win_counts[s]) / n_paths, 4) for s, strategy in enumerate(strategies)
+        },
+        'expectedFinalValue': {
+            strategy: round(float(final_values[s].mean()), 2) for s, strategy in enumerate(strategies)
+        },
+        'expectedFinalWealth': {
+            strategy: round(float(wealth[s].mean()), 2) for s, strategy in enumerate(strategies)
+        },
+        'expectedReturnOnCapital': {
+            strategy: round(float(return_on_capital[s].mean()), 4) for s, strategy in enumerate(strategies)
+        },
+        'initialValue': round(float(initial_units * close[:, 0].mean()), 2)
+    }
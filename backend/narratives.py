@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def template_narrative(stats):
+    """
+    Build the templated analysis text for an event from its statistics.
+
+    Args:
+        stats: Dictionary with 'eventName', 'eventDate' (datetime), 'percentDecline'
+            (fraction) and 'recoveryDays'
+
+    Returns:
+        Dictionary with 'summary' and 'key_insight'
+    """
+    percent_decline = f"{round(stats['percentDecline'] * 100, 1)}%"
+    recovery_months = stats['recoveryDays'] / 20
+    return {
+        'summary': f"The {stats['eventName']} had a significant impact on global markets. "
+                   f"Starting around {stats['eventDate'].strftime('%B %Y')}, markets experienced a sharp decline "
+                   f"of approximately {percent_decline} over a period of several days to weeks. "
+                   f"This was driven by investor uncertainty, risk aversion, and liquidity concerns. "
+                   f"The markets initially showed high volatility with larger than average trading volumes. "
+                   f"Recovery took place gradually over the following months, with a complete return to "
+                   f"pre-event levels taking approximately {recovery_months:.1f} months. "
+                   f"This event demonstrated how external shocks can rapidly impact global financial markets "
+                   f"and the resilience of markets to recover over time.",
+        'key_insight': f"The market took approximately {recovery_months:.1f} months to fully recover from this event, "
+                       f"demonstrating the resilience of financial markets to external shocks over medium-term horizons."
+    }
+
+
+class StubNarrativeClient:
+    """Offline narrative client that returns the templated analysis"""
+    name = 'stub'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def complete(self, stats):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return template_narrative(stats)
+
+
+class OpenAINarrativeClient:
+    """
+    Narrative client backed by the OpenAI chat completions API.
+
+    The openai package is imported and its client built on the first
+    completion, so selecting this client does not slow down a cold start.
+    """
+    name = 'openai'
+
+    def __init__(self, api_key, model='gpt-3.5-turbo', timeout=60):
+        self.model = model
+        self._api_key = api_key
+        self._timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _openai(self):
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI
+                self._client = OpenAI(api_key=self._api_key, timeout=self._timeout)
+            return self._client
+
+    def complete(self, stats):
+        prompt = (
+            "You are a financial markets analyst. Using the statistics below for the MSCI World Index, "
+            "write a short analysis of the event's market impact. Respond with a JSON object with the keys "
+            "'summary' (one paragraph) and 'key_insight' (one sentence).\n\n"
+            f"Event: {stats['eventName']}\n"
+            f"Event date: {stats['eventDate'].strftime('%Y-%m-%d')}\n"
+            f"Analysis window: {stats['startDate']} to {stats['endDate']}\n"
+            f"Percent decline: {round(stats['percentDecline'] * 100, 1)}%\n"
+            f"Recovery time: {stats['recoveryDays']} trading days"
+        )
+        response = self._openai().chat.completions.create(
+            model=self.model,
+            messages=[{'role': 'user', 'content': prompt}],
+            temperature=0.3
+        )
+        content = response.choices[0].message.content
+        try:
+            narrative = json.loads(content)
+            return {'summary': narrative['summary'], 'key_insight': narrative['key_insight']}
+        except (ValueError, KeyError, TypeError):
+            # Fall back to the raw text if the model ignored the JSON instruction
+            return {'summary': content.strip(), 'key_insight': ''}
+
+
+def narrative_key(stats):
+    """Cache key for a narrative: the event, its window and the statistics it describes"""
+    return (
+        stats['eventName'],
+        stats['startDate'],
+        stats['endDate'],
+        round(float(stats['percentDecline']), 6),
+        int(stats['recoveryDays'])
+    )
+
+
+class NarrativeJob:
+    """A narrative completion that runs in the background"""
+
+    def __init__(self, job_id, key):
+        self.id = job_id
+        self.key = key
+        self.status = 'pending'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.done = threading.Event()
+
+    def to_dict(self):
+        job = {'id': self.id, 'status': self.status}
+        if self.result is not None:
+            job['analysis'] = self.result
+        if self.error is not None:
+            job['message'] = self.error
+        return job
+
+
+class NarrativePipeline:
+    """
+    Background narrative generation with caching and request deduplication.
+
+    Concurrent submissions with the same key share one job, so one model call
+    serves them all. Finished jobs stay cached (LRU, bounded) and are served
+    again for later identical requests. Failed jobs are dropped from the cache
+    so the next request retries.
+    """
+
+    def __init__(self, client, max_workers=4, max_jobs=256):
+        self.client = client
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='narrative')
+        self._jobs = OrderedDict()
+        self._jobs_by_key = {}
+        self._lock = threading.Lock()
+
+    def submit(self, stats):
+        """Return the job for these statistics, starting one if none exists"""
+        key = narrative_key(stats)
+        with self._lock:
+            job_id = self._jobs_by_key.get(key)
+            if job_id is not None:
+                self._jobs.move_to_end(job_id)
+                return self._jobs[job_id]
+
+            job = NarrativeJob(uuid.uuid4().hex, key)
+            self._jobs[job.id] = job
+            self._jobs_by_key[key] = job.id
+            while len(self._jobs) > self.max_jobs:
+                _, evicted = self._jobs.popitem(last=False)
+                self._jobs_by_key.pop(evicted.key, None)
+
+        self._executor.submit(self._run, job, stats)
+        return job
+
+    def _run(self, job, stats):
+        job.status = 'running'
+        try:
+            job.result = self.client.complete(stats)
+            job.status = 'complete'
+        except Exception as e:
+            print(f"Error generating narrative for {stats['eventName']}: {str(e)}")
+            job.error = str(e)
+            job.status = 'failed'
+            with self._lock:
+                if self._jobs_by_key.get(job.key) == job.id:
+                    del self._jobs_by_key[job.key]
+        finally:
+            job.done.set()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def narrative_client_from_env(api_key):
+    """
+    Build the narrative client selected by NARRATIVE_CLIENT ('openai' or 'stub').
+
+    Defaults to OpenAI when an API key is configured and to the offline stub otherwise.
+    """
+    client_name = os.getenv("NARRATIVE_CLIENT", "openai" if api_key else "stub").lower()
+    if client_name == 'openai':
+        return OpenAINarrativeClient(api_key, model=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"))
+    return StubNarrativeClient()
@@ -0,0 +1,272 @@
+"""
+Local OHLCV price store and the price sources that serve market series.
+
+Prices are stored per ticker as one memory-mapped .npy file per field under
+<root>/<TICKER>/, with a sorted datetime64[D] index. Slicing a window is a
+binary search on the index plus a zero-copy view of each array. Each write
+saves a new version of every field, then swaps in a manifest naming that
+version, so readers see either the old fields or the new ones, never a mix. The store is
+filled offline by the ingest command, so no network access happens while
+serving requests:
+
+    python price_store.py ingest URTH --start 2012-01-01
+    python price_store.py ingest URTH --csv urth.csv
+"""
+import argparse
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from market_engine import (
+    MarketSeries, generate_market_series, generate_event_impact_series,
+    find_impact_index, event_impact_shape
+)
+
+STORE_FIELDS = ('dates', 'open', 'high', 'low', 'close', 'volume')
+
+# Names the version of the fields a ticker directory currently serves
+MANIFEST_FILE = 'manifest.json'
+
+# Days of slack allowed between the requested window start and the first stored day
+WINDOW_START_TOLERANCE_DAYS = 7
+
+
+class PriceStore:
+    """Directory of per-ticker OHLCV arrays, opened lazily as memory maps"""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _ticker_dir(self, ticker):
+        return os.path.join(self.root_dir, ticker.upper())
+
+    def _version(self, ticker):
+        """Return the current version of a ticker's fields, '' for a store written before manifests, or None"""
+        ticker_dir = self._ticker_dir(ticker)
+        try:
+            with open(os.path.join(ticker_dir, MANIFEST_FILE)) as f:
+                return json.load(f)['version']
+        except FileNotFoundError:
+            return '' if os.path.exists(os.path.join(ticker_dir, 'dates.npy')) else None
+
+    @staticmethod
+    def _field_file(name, version):
+        return f'{name}.{version}.npy' if version else f'{name}.npy'
+
+    def has_ticker(self, ticker):
+        return self._version(ticker) is not None
+
+    def tickers(self):
+        if not os.path.isdir(self.root_dir):
+            return []
+        return sorted(name for name in os.listdir(self.root_dir) if self.has_ticker(name))
+
+    def load(self, ticker):
+        """Return the full stored series for a ticker as read-only memory maps, or None"""
+        ticker = ticker.upper()
+        with self._lock:
+            series = self._series.get(ticker)
+            version = None if series is not None else self._version(ticker)
+            if version is not None:
+                ticker_dir = self._ticker_dir(ticker)
+                arrays = [
+                    np.load(os.path.join(ticker_dir, self._field_file(name, version)), mmap_mode='r')
+                    for name in STORE_FIELDS
+                ]
+                series = MarketSeries(*arrays)
+                self._series[ticker] = series
+        return series
+
+    def window(self, ticker, start_date, end_date):
+        """
+        Slice the stored series to [start_date, end_date] without copying.
+
+        Returns:
+            MarketSeries of views into the memory maps, or None if the ticker is not stored
+        """
+        series = self.load(ticker)
+        if series is None:
+            return None
+        start = np.datetime64(start_date.date() if hasattr(start_date, 'date') else start_date, 'D')
+        end = np.datetime64(end_date.date() if hasattr(end_date, 'date') else end_date, 'D')
+        lo = int(np.searchsorted(series.dates, start, side='left'))
+        hi = int(np.searchsorted(series.dates, end, side='right'))
+        return MarketSeries(*(getattr(series, name)[lo:hi] for name in STORE_FIELDS))
+
+    def covers(self, ticker, start_date):
+        """Return True if the stored history for a ticker reaches back to start_date"""
+        series = self.load(ticker)
+        if series is None or len(series) == 0:
+            return False
+        start = np.datetime64(start_date.date() if hasattr(start_date, 'date') else start_date, 'D')
+        return series.dates[0] <= start + np.timedelta64(WINDOW_START_TOLERANCE_DAYS, 'D')
+
+    def write(self, ticker, series):
+        """
+        Replace the stored series for a ticker.
+
+        The fields are written under a new version and the manifest is
+        swapped in last with one os.replace. The previous version is kept for
+        readers that are still opening it; older ones are removed.
+        """
+        ticker = ticker.upper()
+        ticker_dir = self._ticker_dir(ticker)
+        os.makedirs(ticker_dir, exist_ok=True)
+        previous = self._version(ticker)
+        version = uuid.uuid4().hex
+        order = np.argsort(series.dates, kind='stable')
+        arrays = {
+            'dates': np.asarray(series.dates, dtype='datetime64[D]')[order],
+            'open': np.asarray(series.open, dtype=np.float64)[order],
+            'high': np.asarray(series.high, dtype=np.float64)[order],
+            'low': np.asarray(series.low, dtype=np.float64)[order],
+            'close': np.asarray(series.close, dtype=np.float64)[order],
+            'volume': np.asarray(series.volume, dtype=np.int64)[order]
+        }
+        for name, values in arrays.items():
+            np.save(os.path.join(ticker_dir, self._field_file(name, version)), values)
+        tmp_path = os.path.join(ticker_dir, f'{MANIFEST_FILE}.{version}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': version}, f)
+        os.replace(tmp_path, os.path.join(ticker_dir, MANIFEST_FILE))
+        with self._lock:
+            self._series.pop(ticker, None)
+
+        kept = {self._field_file(name, v) for name in STORE_FIELDS for v in (version, previous) if v is not None}
+        for file_name in os.listdir(ticker_dir):
+            if file_name.endswith('.npy') and file_name not in kept:
+                try:
+                    os.remove(os.path.join(ticker_dir, file_name))
+                except OSError:
+                    pass
+
+
+class MockPriceSource:
+    """Price source that generates random mock series"""
+    name = 'mock'
+
+    def market_series(self, start_date, end_date, rng):
+        return generate_market_series(start_date, end_date, rng)
+
+    def event_series(self, start_date, end_date, impact_date, severity, rng):
+        """Return (series, recovery_days, impact_idx) for an event window"""
+        return generate_event_impact_series(start_date, end_date, impact_date, severity, rng)
+
+
+class StorePriceSource:
+    """
+    Price source that reads real prices for a ticker from a PriceStore.
+
+    Windows the store does not cover fall back to the mock source. Real
+    series already contain the event, so no synthetic crash is applied.
+    """
+
+    def __init__(self, store, ticker, fallback=None):
+        self.store = store
+        self.ticker = ticker
+        self.fallback = fallback or MockPriceSource()
+        self.name = f'store:{ticker.upper()}'
+
+    def market_series(self, start_date, end_date, rng):
+        if not self.store.covers(self.ticker, start_date):
+            return self.fallback.market_series(start_date, end_date, rng)
+        return self.store.window(self.ticker, start_date, end_date)
+
+    def event_series(self, start_date, end_date, impact_date, severity, rng):
+        """Return (series, recovery_days, impact_idx) for an event window"""
+        if not self.store.covers(self.ticker, start_date):
+            return self.fallback.event_series(start_date, end_date, impact_date, severity, rng)
+        series = self.store.window(self.ticker, start_date, end_date)
+        return series, event_impact_shape(severity)[1], find_impact_index(series.dates, impact_date)
+
+
+def price_source_from_env(default_ticker):
+    """
+    Build the price source configured by PRICE_SOURCE ('mock' or 'store').
+
+    The store source reads PRICE_STORE_DIR (default backend/data/prices) and
+    PRICE_TICKER (default default_ticker).
+    """
+    if os.getenv("PRICE_SOURCE", "mock").lower() != 'store':
+        return MockPriceSource()
+    store = PriceStore(os.getenv("PRICE_STORE_DIR", default_store_dir()))
+    return StorePriceSource(store, os.getenv("PRICE_TICKER", default_ticker))
+
+
+def default_store_dir():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'prices')
+
+
+def frame_to_series(frame):
+    """Convert a pandas OHLCV DataFrame indexed by date into a MarketSeries"""
+    frame = frame.sort_index()
+    dates = np.asarray(frame.index.values, dtype='datetime64[D]')
+    columns = {column.lower(): column for column in frame.columns}
+    return MarketSeries(
+        dates,
+        frame[columns['open']].to_numpy(dtype=np.float64),
+        frame[columns['high']].to_numpy(dtype=np.float64),
+        frame[columns['low']].to_numpy(dtype=np.float64),
+        frame[columns['close']].to_numpy(dtype=np.float64),
+        frame[columns['volume']].fillna(0).to_numpy(dtype=np.int64)
+    )
+
+
+def ingest(ticker, store, start=None, end=None, csv_path=None):
+    """
+    Download (or read from CSV) daily OHLCV for a ticker and write it to the store.
+
+    Returns:
+        Number of rows written
+    """
+    import pandas as pd
+
+    if csv_path:
+        frame = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+    else:
+        import yfinance as yf
+        frame = yf.download(ticker, start=start, end=end, progress=False, auto_adjust=False)
+        if isinstance(frame.columns, pd.MultiIndex):
+            frame.columns = frame.columns.get_level_values(0)
+    frame = frame.dropna(subset=[column for column in frame.columns if column.lower() == 'close'])
+    if frame.empty:
+        raise ValueError(f"No price data found for {ticker}")
+
+    store.write(ticker, frame_to_series(frame))
+    return len(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local price store")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help="Ingest daily OHLCV for a ticker")
+    ingest_parser.add_argument('ticker')
+    ingest_parser.add_argument('--start', help="First date to download (YYYY-MM-DD)")
+    ingest_parser.add_argument('--end', help="Last date to download (YYYY-MM-DD)")
+    ingest_parser.add_argument('--csv', help="Read OHLCV from a CSV file instead of downloading")
+    ingest_parser.add_argument('--dir', default=os.getenv("PRICE_STORE_DIR", default_store_dir()))
+
+    subparsers.add_parser('list', help="List stored tickers").add_argument(
+        '--dir', default=os.getenv("PRICE_STORE_DIR", default_store_dir())
+    )
+
+    args = parser.parse_args()
+    store = PriceStore(args.dir)
+
+    if args.command == 'ingest':
+        rows = ingest(args.ticker, store, args.start, args.end, args.csv)
+        print(f"Stored {rows} rows for {args.ticker.upper()} in {args.dir}")
+    elif args.command == 'list':
+        for ticker in store.tickers():
+            series = store.load(ticker)
+            print(f"{ticker}: {len(series)} rows from {series.dates[0]} to {series.dates[-1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import dataclasses
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from scenario_store import SharedScenarioStore
+from seeding import MAX_SEED
+
+
+def scenario_key(event_name, start_date, end_date, severity, seed=None, portfolio=None, source='mock'):
+    """
+    Build the cache key for a scenario.
+
+    Args:
+        event_name: Name of the matched event
+        start_date: First date of the window
+        end_date: Last date of the window
+        severity: Fractional decline of the event
+        seed: Optional explicit random seed
+        portfolio: Optional portfolio hash (see portfolio_hash)
+        source: Name of the price source the series comes from
+
+    Returns:
+        Hashable tuple identifying the scenario
+    """
+    return (
+        event_name,
+        start_date.strftime('%Y-%m-%d'),
+        end_date.strftime('%Y-%m-%d'),
+        round(float(severity), 6),
+        seed,
+        portfolio,
+        source
+    )
+
+
+def with_portfolio(key, portfolio):
+    """Return a copy of a scenario key for the given portfolio hash"""
+    return key[:5] + (portfolio,) + key[6:]
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def scenario_seed(key):
+    """Return the explicit seed of a scenario key, or derive one from the rest of it (ignoring the portfolio)"""
+    if key[4] is not None:
+        return int(key[4])
+    return int(_digest(list(key[:4]))[:16], 16) & MAX_SEED
+
+
+def portfolio_hash(investments):
+    """Hash the parts of a portfolio (validated Investment records) that affect simulation results"""
+    return _digest([
+        [inv.id, inv.name, inv.amount, inv.ticker, inv.beta, inv.volatility]
+        for inv in investments
+    ])[:16]
+
+
+def strategies_hash(specs):
+    """Hash a sequence of StrategySpecs"""
+    return _digest([dataclasses.astuple(spec) for spec in specs])[:16]
+
+
+class ScenarioCache:
+    """
+    Bounded LRU cache with a time-to-live and an optional shared tier.
+
+    With a cache directory, every value is also kept in a SharedScenarioStore
+    there, so all workers pointing at the directory share it. A value
+    computed here is replaced in memory by its zero-copy view into the store,
+    so its pages are held once per node rather than once per worker.
+    Entries in memory hold a lease on their store entry until they leave the
+    cache. Values must be picklable when a cache directory is configured.
+    """
+
+    def __init__(self, max_entries=128, ttl_seconds=3600, cache_dir=None, max_disk_bytes=1 << 30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.store = SharedScenarioStore(cache_dir, max_disk_bytes, ttl_seconds) if cache_dir else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expired(self, created_at):
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _released(self, keys):
+        """Drop the store leases of entries that left memory"""
+        if self.store:
+            for key in keys:
+                self.store.release(key)
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                expired = True
+            else:
+                expired = False
+        if expired:
+            self._released([key])
+
+        if self.store:
+            value = self.store.attach(key)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                self._insert(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _insert(self, key, value):
+        evicted = []
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+        self._released(evicted)
+
+    def put(self, key, value):
+        """
+        Store a value in memory and, if configured, in the shared store.
+
+        Returns:
+            The value as cached: its view into the shared store when it was stored there
+        """
+        if self.store:
+            stored = self.store.put(key, value)
+            if stored is not None:
+                value = stored
+        self._insert(key, value)
+        return value
+
+    def get_or_create(self, key, factory):
+        """Return the cached value for key, calling factory() to build it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, factory())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store:
+            self.store.release_all()
+
+    def stats(self):
+        """Return hit/miss counters and occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'diskHits': self.disk_hits,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+        if self.store:
+            stats['store'] = self.store.stats()
+        return stats
@@ -0,0 +1,299 @@
+"""
+Scenario store shared by every worker process on a node.
+
+Each cached value (event series, LOD pyramids, strategy results) is written
+once to a file under the store directory. The value's object graph is
+pickled, and every numpy array in it is written out of band into the same
+file, aligned for direct use. Attaching memory-maps the file and rebuilds the
+arrays as read-only views into the mapping. The arrays are never copied, so
+all workers that attach a scenario share one copy of its pages. Point the
+directory at a tmpfs such as /dev/shm to keep the store in memory.
+
+Entries are reference counted by the kernel. A worker holds a shared
+advisory lock (a lease) on each entry it has attached. An entry can only be
+evicted under an exclusive lock, so entries still held by a worker are
+skipped, and a crashed worker's leases go away with it. Evicting removes the
+file, but views that are already attached stay valid until they are dropped.
+Writes that would push the store past max_bytes first evict the oldest
+unleased entries, and are skipped if that does not make enough room.
+
+Entries are unpickled when attached, so the directory must be private to the
+user running the server: it is created with mode 0700, and an existing one
+that another user owns or could write to is refused.
+
+Values must be picklable. The lease and eviction protocol needs fcntl.
+Without it (Windows), entries are never leased, and files that are still
+mapped cannot be removed.
+"""
+import hashlib
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+STORE_SUFFIX = '.scn'
+
+# File prefix: magic bytes, then the offset of the pickled header
+_MAGIC = b'SCNSTOR1'
+_PREFIX = struct.Struct('<8sQ')
+
+# Alignment of every array in a store file
+_ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _attach_array(buffer, dtype, shape):
+    """Rebuild an array over a buffer; a read-only mapping gives a read-only array"""
+    return np.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+
+class _ArrayPickler(pickle.Pickler):
+    """Pickler that hands the data of every plain numpy array to buffer_callback"""
+
+    def reducer_override(self, obj):
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject:
+            return NotImplemented
+        # Covers memory-mapped and datetime64 arrays, which numpy itself pickles in band
+        data = np.ascontiguousarray(obj).reshape(-1).view(np.uint8)
+        return _attach_array, (pickle.PickleBuffer(data), obj.dtype.str, obj.shape)
+
+
+def encode_value(value):
+    """
+    Pickle a value with its array data kept out of band.
+
+    Returns:
+        Tuple of (pickle bytes, list of PickleBuffer)
+    """
+    buffers = []
+    stream = io.BytesIO()
+    _ArrayPickler(stream, protocol=5, buffer_callback=buffers.append).dump(value)
+    return stream.getvalue(), buffers
+
+
+def _layout(buffers):
+    """Return the (offset, length) of each buffer in a store file, and the offset of the header"""
+    spans = []
+    offset = _PREFIX.size
+    for buffer in buffers:
+        offset = _aligned(offset)
+        length = buffer.raw().nbytes
+        spans.append((offset, length))
+        offset += length
+    return spans, offset
+
+
+def _private_directory(path):
+    """
+    Create the store directory readable by this user only, or check an existing one.
+
+    Entries are unpickled, so anyone able to write to the directory could run
+    code in the server. An existing directory must belong to the current user
+    and must not be writable by group or others.
+
+    Raises:
+        PermissionError: If the directory could be written by another user
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        raise PermissionError(f"Scenario store directory {path} is not owned by the current user")
+    if info.st_mode & 0o022:
+        raise PermissionError(f"Scenario store directory {path} is writable by other users")
+
+
+class SharedScenarioStore:
+    """
+    Directory of memory-mapped scenario entries with leases and a size cap.
+
+    Args:
+        root_dir: Directory holding the entries, shared by every worker
+        max_bytes: Most bytes the entries may take up together
+        ttl_seconds: Seconds after writing before an entry expires (None keeps entries)
+    """
+
+    def __init__(self, root_dir, max_bytes=1 << 30, ttl_seconds=None):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.writes = 0
+        self.evictions = 0
+        self.skipped_writes = 0
+        self._leases = {}
+        self._lock = threading.Lock()
+        _private_directory(root_dir)
+
+    def _path(self, key):
+        digest = hashlib.sha256(json.dumps(list(key), sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return os.path.join(self.root_dir, f'{digest}{STORE_SUFFIX}')
+
+    def _expired(self, written_at):
+        return self.ttl_seconds is not None and time.time() - written_at > self.ttl_seconds
+
+    def _hold(self, path, handle):
+        """Keep a lease on an attached entry until it is released, replacing any earlier lease"""
+        with self._lock:
+            previous = self._leases.pop(path, None)
+            self._leases[path] = handle
+        if previous is not None:
+            previous.close()
+
+    def attach(self, key):
+        """
+        Map a stored entry and lease it for this process.
+
+        Returns:
+            The value with its arrays as read-only views of the mapping, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            handle = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_SH)
+            if self._expired(os.fstat(handle.fileno()).st_mtime):
+                handle.close()
+                self._evict(path)
+                return None
+            mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, header_offset = _PREFIX.unpack_from(mapping)
+            if magic != _MAGIC:
+                raise ValueError(f"Not a scenario store entry: {path}")
+            payload, spans = pickle.loads(mapping[header_offset:])
+            view = memoryview(mapping)
+            value = pickle.loads(payload, buffers=[view[offset:offset + length] for offset, length in spans])
+        except (OSError, ValueError, struct.error, pickle.UnpicklingError, EOFError) as e:
+            handle.close()
+            print(f"Warning: could not attach scenario store entry {path}: {e}")
+            return None
+        self._hold(path, handle)
+        return value
+
+    def release(self, key):
+        """Drop this process's lease on an entry, so it may be evicted"""
+        with self._lock:
+            handle = self._leases.pop(self._path(key), None)
+        if handle is not None:
+            handle.close()
+
+    def release_all(self):
+        with self._lock:
+            handles, self._leases = list(self._leases.values()), {}
+        for handle in handles:
+            handle.close()
+
+    def put(self, key, value):
+        """
+        Write a value to the store and attach it.
+
+        Returns:
+            The attached value, or None if it could not be stored within the size cap
+        """
+        payload, buffers = encode_value(value)
+        spans, header_offset = _layout(buffers)
+        header = pickle.dumps((payload, spans), protocol=5)
+        size = header_offset + len(header)
+        if not self._make_room(size):
+            self.skipped_writes += 1
+            return None
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+                f.write(_PREFIX.pack(_MAGIC, header_offset))
+                for buffer, (offset, _) in zip(buffers, spans):
+                    f.seek(offset)
+                    f.write(buffer.raw())
+                f.seek(header_offset)
+                f.write(header)
+            # Workers attached to an older entry keep their mapping of the replaced file
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not write scenario store entry to {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+        self.writes += 1
+        return self.attach(key)
+
+    def _evict(self, path):
+        """Remove an entry unless some process holds a lease on it; returns True if removed"""
+        try:
+            with open(path, 'rb') as handle:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        return False
+                os.remove(path)
+        except OSError:
+            return False
+        with self._lock:
+            self.evictions += 1
+        return True
+
+    def _entries(self):
+        """Return (written_at, size, path) of every entry, oldest first"""
+        entries = []
+        try:
+            names = os.listdir(self.root_dir)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(STORE_SUFFIX):
+                continue
+            path = os.path.join(self.root_dir, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        return sorted(entries)
+
+    def _make_room(self, size):
+        """Evict expired entries, then the oldest unleased ones, until `size` more bytes fit"""
+        if size > self.max_bytes:
+            return False
+        entries = self._entries()
+        used = sum(entry_size for _, entry_size, _ in entries)
+        for written_at, entry_size, path in entries:
+            if not self._expired(written_at) and used + size <= self.max_bytes:
+                continue
+            if self._evict(path):
+                used -= entry_size
+        return used + size <= self.max_bytes
+
+    def stats(self):
+        """Return occupancy of the whole store and this process's counters"""
+        entries = self._entries()
+        with self._lock:
+            leases = len(self._leases)
+        return {
+            'dir': self.root_dir,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'maxBytes': self.max_bytes,
+            'leases': leases,
+            'writes': self.writes,
+            'skippedWrites': self.skipped_writes,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,61 @@
+"""
+Sensitivity sweeps of one-off trades over a grid of scenarios.
+
+A sweep asks how much better or worse than holding a portfolio ends up if it
+sells (withdraw) or buys (add) a fraction of its position once, for every
+combination of event severity, trade day and trade size. Each trade is the
+built-in strategy of the same name (see simulation.builtin_strategy) moved
+to another day and size, and is compared with holding on total wealth, as in
+the Monte Carlo comparison: the final value plus the cash the trade took
+out, with trades at the previous close like every strategy rule.
+"""
+import numpy as np
+
+from holdings import holding_growth_matrix, open_store
+from seeding import generator
+from simulation import builtin_strategy, trade_wealth, unit_multipliers
+
+# Trades compared with holding
+SWEEP_ACTIONS = ('withdraw', 'add')
+
+
+def trade_edges(growth, impact_idx, offsets, cash_flows):
+    """
+    Wealth gained over holding by each one-off trade, per unit of initial investment.
+
+    Args:
+        growth: Cumulative growth relative to the first day, shape (holdings, days)
+        impact_idx: Index of the event impact start
+        offsets: Trade days relative to the impact day (all inside the window)
+        cash_flows: Fractions of the position sold or bought
+
+    Returns:
+        Array of shape (actions, offsets, cash_flows, holdings)
+    """
+    days = growth.shape[-1]
+    edges = np.empty((len(SWEEP_ACTIONS), len(offsets), len(cash_flows), len(growth)))
+    # One batch of specs per trade day keeps the unit arrays small
+    for o, offset in enumerate(offsets):
+        specs = [
+            builtin_strategy(action, cash_flow, offset) for action in SWEEP_ACTIONS for cash_flow in cash_flows
+        ]
+        wealth = trade_wealth(unit_multipliers(specs, days, impact_idx), growth)
+        edges[:, o] = (wealth - growth[:, -1:]).T.reshape(len(SWEEP_ACTIONS), len(cash_flows), len(growth))
+    return edges
+
+
+def sweep_portfolio_kernel(base_series, impact_idx, portfolio, seed, offsets, cash_flows, store_dir=None):
+    """
+    Build a portfolio's holding growth matrix and sweep every trade on it.
+
+    A self-contained, picklable entry point so large sweeps can run in a
+    separate process (see ComputePool). The seed should not depend on the
+    severity, so every severity sees the same idiosyncratic noise.
+
+    Returns:
+        Tuple of (dollar edges over holding, shape (actions, offsets, cash_flows, holdings),
+        final hold values per holding)
+    """
+    growth = holding_growth_matrix(base_series, portfolio.investments, generator(seed), open_store(store_dir))
+    edges = trade_edges(growth, impact_idx, offsets, cash_flows) * portfolio.amounts
+    return edges, portfolio.amounts * growth[:, -1]
@@ -0,0 +1,187 @@
+import json
+import struct
+
+import numpy as np
+from flask import Response, current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+from instrumentation import span
+
+
+class MarketJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes columnar series and strategy results at encode time"""
+
+    def default(self, o):
+        # MarketSeries and StrategyResult expand to their list-of-dicts shape here,
+        # so endpoints can hand them to jsonify without building rows up front
+        if hasattr(o, 'to_records'):
+            return o.to_records()
+        # Columnar payloads carry raw arrays; dates become 'YYYY-MM-DD' strings
+        if isinstance(o, np.ndarray):
+            if np.issubdtype(o.dtype, np.datetime64):
+                return np.datetime_as_string(o, unit='D').tolist()
+            return o.tolist()
+        return super().default(o)
+
+    def response(self, *args, **kwargs):
+        with span('json_encode'):
+            return super().response(*args, **kwargs)
+
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_stream(req):
+    """Return True if the request opted into NDJSON streaming (?stream=1 or Accept header)"""
+    if req.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return req.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def _ndjson_line(obj):
+    return current_app.json.dumps(obj, separators=(',', ':')) + '\n'
+
+
+def ndjson_response(lines):
+    """
+    Stream an iterable of JSON-serializable objects as newline-delimited JSON.
+
+    Objects are encoded one at a time as the client reads them. An exception
+    raised while streaming is reported as a final {'type': 'error'} line,
+    since the status code has already been sent.
+    """
+    def generate():
+        try:
+            for line in lines:
+                yield _ndjson_line(line)
+        except Exception as e:
+            print(f"Error while streaming response: {str(e)}")
+            yield _ndjson_line({'type': 'error', 'status': 'error', 'message': str(e)})
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def stream_series_rows(meta, series):
+    """Yield a metadata line followed by one line per row of a series"""
+    yield dict(meta, type='meta')
+    for row in series.iter_records():
+        row['type'] = 'row'
+        yield row
+
+
+def stream_strategy_results(meta, strategies_data, individual_stocks):
+    """Yield a metadata line followed by one line per strategy and per stock strategy series"""
+    yield dict(meta, type='meta')
+    for strategy, result in strategies_data.items():
+        yield {'type': 'strategy', 'strategy': strategy, 'data': result}
+    for stock_id, stock in individual_stocks.items():
+        for strategy, result in stock['strategies'].items():
+            yield {
+                'type': 'stock',
+                'id': stock_id,
+                'name': stock['name'],
+                'initialAmount': stock['initialAmount'],
+                'strategy': strategy,
+                'data': result
+            }
+
+
+# Response formats selectable with ?format=
+RESPONSE_FORMATS = ('json', 'columnar', 'binary')
+
+BINARY_MIMETYPE = 'application/octet-stream'
+BINARY_MAGIC = b'MCB1'
+
+
+def response_format(req):
+    """Return the requested response format (default 'json'), or None if it is not supported"""
+    fmt = req.args.get('format', 'json').lower()
+    return fmt if fmt in RESPONSE_FORMATS else None
+
+
+def strategy_columns(strategies_data, individual_stocks):
+    """
+    Build the columnar form of strategy results.
+
+    All results share one base series, so the date axis (and, for the default
+    strategies, the prices) are sent once instead of once per row.
+
+    Returns:
+        Dictionary with 'dates', optional 'prices', 'strategies' and 'individualStocks'
+    """
+    first_result = next(iter(strategies_data.values()))
+    prices = first_result.series.columns()
+    columns = {
+        'dates': prices.pop('date'),
+        'strategies': {strategy: result.values for strategy, result in strategies_data.items()},
+        'individualStocks': {
+            stock_id: {
+                'name': stock['name'],
+                'initialAmount': stock['initialAmount'],
+                'strategies': {strategy: result.values for strategy, result in stock['strategies'].items()}
+            }
+            for stock_id, stock in individual_stocks.items()
+        }
+    }
+    if first_result.include_prices:
+        columns['prices'] = prices
+    return columns
+
+
+def encode_binary(columns, meta=None):
+    """
+    Encode named arrays as a compact little-endian binary payload.
+
+    Layout: the 4-byte magic b'MCB1', a uint32 header length, a UTF-8 JSON
+    header, then each column's raw bytes in header order. The header lists
+    'rows' and, per column, its 'name' and 'dtype': '<i4' days since
+    1970-01-01 for dates, '<i4' for integer columns and '<f4' otherwise.
+    Any 'meta' (summary, names, ...) is carried in the header as JSON.
+    """
+    encoded = []
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if np.issubdtype(values.dtype, np.datetime64):
+            values = values.astype('datetime64[D]').astype('<i4')
+        elif np.issubdtype(values.dtype, np.integer):
+            values = values.astype('<i4')
+        else:
+            values = values.astype('<f4')
+        encoded.append((name, values))
+
+    header = {
+        'rows': len(encoded[0][1]) if encoded else 0,
+        'columns': [{'name': name, 'dtype': values.dtype.str} for name, values in encoded],
+        'meta': meta or {}
+    }
+    header_bytes = json.dumps(header, default=str, separators=(',', ':')).encode('utf-8')
+    parts = [BINARY_MAGIC, struct.pack('<I', len(header_bytes)), header_bytes]
+    parts.extend(values.tobytes() for _, values in encoded)
+    return b''.join(parts)
+
+
+def binary_response(columns, meta=None):
+    """Return a binary column payload (see encode_binary)"""
+    with span('binary_encode'):
+        payload = encode_binary(columns, meta)
+    return Response(payload, mimetype=BINARY_MIMETYPE)
+
+
+def flatten_strategy_columns(columns):
+    """
+    Flatten strategy columns into named arrays for the binary encoding.
+
+    Portfolio strategies become 'strategy:<name>', prices 'price:<field>' and
+    stock strategies 'stock:<id>:<name>'; stock names and amounts move to the meta.
+    """
+    flat = {'date': columns['dates']}
+    for name, values in columns.get('prices', {}).items():
+        flat[f'price:{name}'] = values
+    for strategy, values in columns['strategies'].items():
+        flat[f'strategy:{strategy}'] = values
+    stocks = {}
+    for stock_id, stock in columns['individualStocks'].items():
+        stocks[stock_id] = {'name': stock['name'], 'initialAmount': stock['initialAmount']}
+        for strategy, values in stock['strategies'].items():
+            flat[f'stock:{stock_id}:{strategy}'] = values
+    return flat, stocks
@@ -0,0 +1,115 @@
+"""
+Production entry point for the backend.
+
+    python serve.py
+
+Runs the app under gunicorn with pre-forked workers (or waitress on
+platforms without gunicorn), without the debug reloader. Configured with:
+
+    HOST, PORT          address to bind (default 0.0.0.0:5000)
+    WEB_WORKERS         worker processes (default 2)
+    WEB_THREADS         threads per worker (default 4)
+    WEB_TIMEOUT         seconds before a stuck worker is restarted (default 60)
+    GRACEFUL_TIMEOUT    seconds in-flight requests get to finish on shutdown (default 30)
+    WEB_PRELOAD         import the app once before forking workers (default 1)
+
+    SHARE_SCENARIOS     share cached scenarios between the workers (default 0)
+
+With SHARE_SCENARIOS=1 and no SCENARIO_CACHE_DIR, the workers share their
+scenarios through a private memory-mapped scenario store in a fresh
+directory (under /dev/shm where it exists), which is removed on exit.
+Otherwise every worker keeps its own cache, unless SCENARIO_CACHE_DIR names
+a directory for the store.
+"""
+import atexit
+import os
+import shutil
+import signal
+import sys
+import tempfile
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def run_gunicorn(host, port):
+    from gunicorn.app.base import BaseApplication
+
+    def worker_exit(server, worker):
+        # Drain the compute pool so running simulations finish before the worker exits
+        import app as app_module
+        app_module.shutdown()
+
+    class StandaloneApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f'{host}:{port}',
+                'workers': _env_int("WEB_WORKERS", 2),
+                'threads': _env_int("WEB_THREADS", 4),
+                'worker_class': 'gthread',
+                'timeout': _env_int("WEB_TIMEOUT", 60),
+                'graceful_timeout': _env_int("GRACEFUL_TIMEOUT", 30),
+                'preload_app': os.getenv("WEB_PRELOAD", "1") == "1",
+                'worker_exit': worker_exit,
+                'accesslog': '-'
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import create_app
+            return create_app()
+
+    StandaloneApplication().run()
+
+
+def run_waitress(host, port):
+    from waitress import serve
+    import app as app_module
+
+    def handle_exit(signum, frame):
+        app_module.shutdown()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, handle_exit)
+    signal.signal(signal.SIGINT, handle_exit)
+    serve(app_module.create_app(), host=host, port=port, threads=_env_int("WEB_THREADS", 4))
+
+
+def private_cache_dir():
+    """
+    Create a directory only this user can access for the shared scenario store.
+
+    It lives on tmpfs where /dev/shm exists, has an unguessable name and mode
+    0700, and is removed when the server exits.
+    """
+    cache_dir = tempfile.mkdtemp(prefix='market-scenarios-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    owner = os.getpid()
+
+    def remove():
+        # Forked workers inherit this handler; only the process that made the directory removes it
+        if os.getpid() == owner:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    atexit.register(remove)
+    return cache_dir
+
+
+def main():
+    if os.getenv("SHARE_SCENARIOS", "0") == "1" and "SCENARIO_CACHE_DIR" not in os.environ:
+        # Set before the app is imported, so every worker inherits the same store
+        os.environ["SCENARIO_CACHE_DIR"] = private_cache_dir()
+    host = os.getenv("HOST", "0.0.0.0")
+    port = _env_int("PORT", 5000)
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("gunicorn is not available, serving with waitress in a single process")
+        run_waitress(host, port)
+    else:
+        run_gunicorn(host, port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+import numpy as np
+from dataclasses import dataclass
+from market_engine import MarketSeries
+from strategy_dsl import StrategySpec, strategy_value_curves
+
+# Strategies applied to custom portfolios, in the order they are reported
+PORTFOLIO_STRATEGIES = ('hold', 'withdraw', 'add')
+
+# Fraction of the position sold or bought by the 'withdraw'/'add' strategies
+CASH_FLOW_FRACTION = 0.2
+
+# Trading days after the impact at which the built-in strategies trade (the event midpoint)
+TRADE_OFFSET = 5
+
+
+def cumulative_growth(close):
+    """
+    Compute the cumulative growth of close prices relative to the first day.
+
+    Equivalent to compounding the daily returns (close[i] - close[i-1]) / close[i-1].
+    Accepts a single series or a (series, days) matrix.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if close.shape[-1] == 0:
+        return close
+    return close / close[..., :1]
+
+
+def builtin_strategy(name, cash_flow=CASH_FLOW_FRACTION, offset=TRADE_OFFSET):
+    """
+    Return the StrategySpec of a built-in strategy.
+
+    'withdraw' sells a fraction of the position and 'add' buys that fraction
+    more of it, both `offset` trading days after the impact. 'hold' has
+    no rules. Every endpoint (including the Monte Carlo engine and the
+    sensitivity sweep) simulates the built-in strategies through these specs,
+    so they make the same trade everywhere.
+    """
+    if name == 'withdraw':
+        return StrategySpec(name, withdrawals=(('impact', offset, cash_flow),))
+    if name == 'add':
+        return StrategySpec(name, buys=(('impact', offset, cash_flow),))
+    if name == 'hold':
+        return StrategySpec(name)
+    raise ValueError(f"Unknown strategy: {name}")
+
+
+def resolve_strategies(strategies, cash_flow=CASH_FLOW_FRACTION):
+    """Turn a sequence of built-in strategy names and StrategySpecs into StrategySpecs"""
+    return [
+        strategy if isinstance(strategy, StrategySpec) else builtin_strategy(strategy, cash_flow)
+        for strategy in strategies
+    ]
+
+
+def strategy_names(strategies):
+    return [strategy.name if isinstance(strategy, StrategySpec) else strategy for strategy in strategies]
+
+
+def unit_multipliers(specs, days, impact_idx):
+    """
+    Units held on each day per unit held at the start, for strategies that only
+    withdraw or buy fractions of the position.
+
+    Those trades scale the units held whatever the price, so the units are the
+    value curves on a flat price and apply to every price path alike.
+
+    Returns:
+        Array of shape (strategies, days)
+    """
+    for spec in specs:
+        if spec.adds or spec.contributions or spec.dips or spec.stop_loss or spec.rebalance:
+            raise ValueError(f"Strategy {spec.name} has rules whose units depend on the price path")
+    return strategy_value_curves(np.ones(days), impact_idx, specs)
+
+
+def trade_cash(units, growth):
+    """
+    Cash paid for the units bought and received for the units sold, per unit of initial investment.
+
+    Units bought or sold on a day trade at the previous close (the first
+    day's own close), like the strategy rules.
+
+    Args:
+        units: Units held per strategy, shape (strategies, days)
+        growth: Cumulative growth of each path, shape (paths, days)
+
+    Returns:
+        Tuple of (cash paid, cash received) arrays of shape (paths, strategies)
+    """
+    traded = np.diff(units, axis=-1, prepend=1.0)
+    trade_days = np.flatnonzero(traded.any(axis=0))
+    trade_growth = growth[:, np.maximum(trade_days - 1, 0)]
+    traded = traded[:, trade_days]
+    return trade_growth @ np.maximum(traded, 0).T, trade_growth @ np.maximum(-traded, 0).T
+
+
+def trade_wealth(units, growth):
+    """
+    Final value plus the net cash taken out by trading, per unit of initial investment.
+
+    Every strategy is compared on the money it put in (see trade_cash).
+
+    Args:
+        units: Units held per strategy, shape (strategies, days)
+        growth: Cumulative growth of each path, shape (paths, days)
+
+    Returns:
+        Array of shape (paths, strategies)
+    """
+    paid, received = trade_cash(units, growth)
+    return growth[:, -1:] * units[None, :, -1] - paid + received
+
+
+def time_weighted_growth(values, start_values):
+    """
+    Growth of one unit invested in each strategy, with its cash flows taken out.
+
+    start_values are the values at the start of each day, after that day's
+    trades, so each day's ratio values / start_values is the strategy's own
+    return: money added or withdrawn is not counted as a gain or a loss.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        day_growth = np.where(start_values > 0, values / start_values, 1.0)
+    return np.cumprod(day_growth, axis=-1)
+
+
+def simulate_holdings(growth, impact_idx, amounts, strategies=PORTFOLIO_STRATEGIES,
+                      cash_flow=CASH_FLOW_FRACTION):
+    """
+    Simulate every holding under every strategy in one broadcast.
+
+    Args:
+        growth: Cumulative growth of each holding, shape (holdings, days)
+        impact_idx: Index of the event impact start
+        amounts: Initial amount invested in each holding
+        strategies: Sequence of built-in strategy names or StrategySpecs
+        cash_flow: Fraction withdrawn or added by the built-in strategies
+
+    Returns:
+        Tuple of (holding values of shape (holdings, strategies, days),
+        portfolio values of shape (strategies, days), and the portfolio's
+        time-weighted growth of shape (strategies, days))
+    """
+    curves, day_growth = strategy_value_curves(
+        growth, impact_idx, resolve_strategies(strategies, cash_flow), with_day_growth=True
+    )
+    amounts = np.asarray(amounts, dtype=np.float64)
+    # The portfolio is the amount-weighted sum of the per-holding curves
+    portfolio_values = np.tensordot(amounts, curves, axes=1)
+    start_values = np.tensordot(amounts, curves / day_growth, axes=1)
+    return amounts[:, None, None] * curves, portfolio_values, time_weighted_growth(portfolio_values, start_values)
+
+
+@dataclass
+class StrategyResult:
+    """
+    Lightweight view of a strategy's value over a shared, read-only base series.
+
+    The base series is never copied: its rows are merged with the value array
+    only when the result is serialized. unit_growth is the time-weighted
+    growth of one unit, net of the strategy's cash flows (see
+    time_weighted_growth); risk figures are measured on it.
+    """
+    series: MarketSeries
+    values: np.ndarray
+    value_key: str = 'portfolio_value'
+    include_prices: bool = True
+    unit_growth: np.ndarray = None
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def initial_value(self):
+        return float(self.values[0])
+
+    @property
+    def final_value(self):
+        return float(self.values[-1])
+
+    def take(self, indices, series=None):
+        """
+        Return the given rows as a new result.
+
+        Pass the base series' rows as `series` when taking the same rows from
+        many results, so they share one reduced series.
+        """
+        if series is None:
+            series = self.series.take(indices)
+        unit_growth = None if self.unit_growth is None else self.unit_growth[indices]
+        return StrategyResult(series, self.values[indices], self.value_key, self.include_prices, unit_growth)
+
+    def iter_records(self, chunk_size=1024):
+        """Lazily yield rows in the list-of-dicts shape served by the API"""
+        if self.include_prices:
+            yield from self.series.iter_records({self.value_key: self.values}, chunk_size)
+            return
+        dates = self.series.date_strings()
+        for start in range(0, len(self), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            for date, value in zip(dates[chunk], self.values[chunk].tolist()):
+                yield {'date': date, self.value_key: value}
+
+    def to_records(self):
+        """Convert to the list-of-dicts shape served by the API"""
+        return list(self.iter_records(chunk_size=max(len(self), 1)))
+
+
+def simulate_investment_strategy(base_series, impact_idx, strategy, initial_units=100):
+    """
+    Simulate one built-in strategy on a position of the index (see builtin_strategy).
+
+    Args:
+        base_series: MarketSeries with the event impact
+        impact_idx: Index of the event impact start
+        strategy: String indicating the strategy ('withdraw', 'add', or 'hold')
+        initial_units: Number of units held at the start
+
+    Returns:
+        StrategyResult with the portfolio value over time
+    """
+    return simulate_index_strategies(base_series, impact_idx, [strategy], initial_units)[strategy]
+
+
+def simulate_index_strategies(base_series, impact_idx, strategies, initial_units=100):
+    """
+    Simulate strategies on a position of initial_units of the index itself.
+
+    Args:
+        base_series: MarketSeries with the event impact
+        impact_idx: Index of the event impact start
+        strategies: Sequence of built-in strategy names or StrategySpecs
+        initial_units: Number of units held at the start
+
+    Returns:
+        Dictionary of StrategyResult keyed by strategy name
+    """
+    close = np.asarray(base_series.close, dtype=np.float64)
+    initial_value = initial_units * close[0] if len(close) else 0.0
+    curves, day_growth = strategy_value_curves(
+        cumulative_growth(close), impact_idx, resolve_strategies(strategies), with_day_growth=True
+    )
+    unit_growth = time_weighted_growth(curves, curves / day_growth)
+    return {
+        name: StrategyResult(base_series, initial_value * values, unit_growth=growth)
+        for name, values, growth in zip(strategy_names(strategies), curves, unit_growth)
+    }
@@ -0,0 +1,274 @@
+"""
+Declarative investment strategies compiled to array operations.
+
+A strategy is a named set of rules applied to a position that starts as one
+unit of value (fully invested, or split with cash when rebalancing):
+
+    add           invest `amount` once, `offset` trading days after the anchor
+    withdraw      sell `fraction` of the position once
+    buy           buy `fraction` more of the position once
+    contribute    invest `amount` every `every` trading days, optionally `count` times
+    buy_the_dip   invest `amount` the day after the price first falls `drawdown` below its peak
+    stop_loss     sell everything when the price falls `trail` below its running peak,
+                  and optionally buy back (`reenter`) once it regains the peak
+    rebalance     keep `target` of the value invested and the rest in cash, trading back
+                  to the target whenever the invested weight drifts more than `threshold`
+
+Amounts are fractions of the initial investment, and fractions are of the
+position held at the time, so one spec applies to a single holding and to a
+whole portfolio alike. Anchors are 'start' (the first
+day) or 'impact' (the event impact day). Scheduled trades happen at the
+previous close, so they take part in that day's return.
+
+Scheduled cash flows are compiled to (strategies, days) arrays up front.
+Price-triggered rules are found with cumulative maxima and first-crossing
+searches over the whole growth matrix, and values then follow from one
+cumulative product. No step loops over days per strategy. Only threshold
+rebalancing iterates, scanning a few days per pass for the next rebalance of
+every holding and strategy at once.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+RULE_TYPES = ('add', 'withdraw', 'buy', 'contribute', 'buy_the_dip', 'stop_loss', 'rebalance')
+
+ANCHORS = ('start', 'impact')
+
+
+@dataclass(frozen=True)
+class StrategySpec:
+    """
+    A compiled-ready strategy: its name and its rules grouped by type.
+
+    adds:          tuple of (anchor, offset, amount)
+    withdrawals:   tuple of (anchor, offset, fraction)
+    buys:          tuple of (anchor, offset, fraction)
+    contributions: tuple of (anchor, offset, amount, every, count or None)
+    dips:          tuple of (drawdown, amount)
+    stop_loss:     (trail, reenter) or None
+    rebalance:     (target, threshold) or None
+    """
+    name: str
+    adds: tuple = ()
+    withdrawals: tuple = ()
+    buys: tuple = ()
+    contributions: tuple = ()
+    dips: tuple = ()
+    stop_loss: tuple = None
+    rebalance: tuple = None
+
+
+def _anchor_index(anchor, impact_idx):
+    return impact_idx if anchor == 'impact' else 0
+
+
+def compile_schedules(specs, days, impact_idx):
+    """
+    Compile the scheduled (price-independent) rules of each strategy.
+
+    Returns:
+        Tuple of (inflows, kept) arrays of shape (strategies, days): the cash
+        invested at each day's open as a fraction of the initial investment,
+        and the factor the position is scaled by that day's withdrawals and buys
+    """
+    inflows = np.zeros((len(specs), days))
+    kept = np.ones((len(specs), days))
+    for s, spec in enumerate(specs):
+        for anchor, offset, amount in spec.adds:
+            day = _anchor_index(anchor, impact_idx) + offset
+            if 0 <= day < days:
+                inflows[s, day] += amount
+        for anchor, offset, fraction in spec.withdrawals:
+            day = _anchor_index(anchor, impact_idx) + offset
+            if 0 <= day < days:
+                kept[s, day] *= 1 - fraction
+        for anchor, offset, fraction in spec.buys:
+            day = _anchor_index(anchor, impact_idx) + offset
+            if 0 <= day < days:
+                kept[s, day] *= 1 + fraction
+        for anchor, offset, amount, every, count in spec.contributions:
+            first = _anchor_index(anchor, impact_idx) + offset
+            schedule = np.arange(max(first, 0), days, every)
+            schedule = schedule[(schedule - first) % every == 0]
+            if count is not None:
+                schedule = schedule[schedule < first + every * count]
+            inflows[s, schedule] += amount
+    return inflows, kept
+
+
+def _first_true(mask):
+    """Index of the first True along the last axis, or the axis length if there is none"""
+    return np.where(mask.any(axis=-1), mask.argmax(axis=-1), mask.shape[-1])
+
+
+def _dip_inflows(inflows, specs, drawdown):
+    """Add the buy-the-dip purchases, triggered per holding, to inflows (holdings, strategies, days)"""
+    rules = [(s, depth, amount) for s, spec in enumerate(specs) for depth, amount in spec.dips]
+    if not rules:
+        return
+    strategy_idx, depths, amounts = (np.array(column) for column in zip(*rules))
+    days = drawdown.shape[-1]
+    # Bought at the open after the first close at or below the drawdown level
+    buy_day = _first_true(drawdown[:, None, :] <= -depths[None, :, None]) + 1
+    triggered = buy_day < days
+    holding_idx = np.broadcast_to(np.arange(len(drawdown))[:, None], buy_day.shape)
+    np.add.at(
+        inflows,
+        (holding_idx[triggered], np.broadcast_to(strategy_idx, buy_day.shape)[triggered], buy_day[triggered]),
+        np.broadcast_to(amounts, buy_day.shape)[triggered]
+    )
+
+
+def _stop_loss_weights(weights, specs, growth, running_peak, drawdown):
+    """Zero the invested weight of stop-loss strategies between the stop and the re-entry"""
+    rules = [(s,) + spec.stop_loss for s, spec in enumerate(specs) if spec.stop_loss]
+    if not rules:
+        return
+    strategy_idx, trails, reenter = (np.array(column) for column in zip(*rules))
+    days = growth.shape[-1]
+    day = np.arange(days)
+    stop_day = _first_true(drawdown[:, None, :] <= -trails[None, :, None])
+    # Buy back at the first close that regains the peak the stop was measured from
+    stop_peak = np.take_along_axis(running_peak, np.minimum(stop_day, days - 1), axis=-1)
+    regained = (day > stop_day[..., None]) & (growth[:, None, :] >= stop_peak[..., None])
+    reentry_day = np.where(reenter[None, :], _first_true(regained), days)
+    out = (day > stop_day[..., None]) & (day <= reentry_day[..., None])
+    weights[:, strategy_idx, :] = np.where(out, 0.0, weights[:, strategy_idx, :])
+
+
+# Days scanned per pass when looking for the next rebalance
+REBALANCE_SCAN_DAYS = 16
+
+
+def _rebalance_weights(weights, specs, growth):
+    """
+    Fill in the invested weight of threshold-rebalancing strategies.
+
+    Between rebalances the invested weight drifts with the price, so its
+    log-odds move with the log price: logit(w_t) = logit(target) + log(g_t / g_r).
+    Strategies sharing a (target, threshold) pair share one weight path. Each
+    pass scans the next few days of every (holding, rule) pair at once for a
+    threshold breach, so passes scale with the number of rebalances, not
+    with the number of strategies.
+    """
+    rules = {}
+    for s, spec in enumerate(specs):
+        if spec.rebalance:
+            rules.setdefault(spec.rebalance, []).append(s)
+    if not rules:
+        return
+    targets, thresholds = (np.array(column) for column in zip(*rules))
+    holdings, days = growth.shape
+    log_growth = np.log(growth)
+
+    # One row per (holding, distinct rule) pair
+    row_holding = np.repeat(np.arange(holdings), len(rules))
+    row_target = np.tile(targets, holdings)
+    row_threshold = np.tile(thresholds, holdings)
+    row_logit = np.log(row_target / (1 - row_target))
+    weight = np.repeat(row_target[:, None], days, axis=1)
+    last = np.zeros(len(row_holding), dtype=np.int64)
+    scan = np.zeros(len(row_holding), dtype=np.int64)
+    active = np.arange(len(row_holding))
+    offsets = np.arange(REBALANCE_SCAN_DAYS)
+
+    while len(active):
+        window = scan[active][:, None] + offsets[None, :]
+        in_range = window < days
+        window = np.minimum(window, days - 1)
+        holding = row_holding[active][:, None]
+        # Weight at each close in the window since the last rebalance
+        drift = log_growth[holding, window] - log_growth[holding, last[active][:, None]]
+        close_weight = 1 / (1 + np.exp(-(row_logit[active][:, None] + drift)))
+        breach = in_range & (np.abs(close_weight - row_target[active][:, None]) > row_threshold[active][:, None])
+        first = _first_true(breach)
+        # The weight held through day t+1 is the weight at close t (the target again after a rebalance)
+        fill = in_range & (offsets[None, :] < first[:, None]) & (window + 1 < days)
+        rows = np.broadcast_to(active[:, None], window.shape)
+        weight[rows[fill], window[fill] + 1] = close_weight[fill]
+
+        rebalanced = first < REBALANCE_SCAN_DAYS
+        next_scan = np.where(rebalanced, scan[active] + first, scan[active] + REBALANCE_SCAN_DAYS)
+        last[active[rebalanced]] = next_scan[rebalanced]
+        scan[active] = next_scan
+        active = active[next_scan < days]
+
+    weight = weight.reshape(holdings, len(rules), days)
+    for r, strategy_idx in enumerate(rules.values()):
+        weights[:, strategy_idx, :] = weight[:, r:r + 1, :]
+
+
+def strategy_value_curves(growth, impact_idx, specs, with_day_growth=False):
+    """
+    Compute the value of one unit of initial investment under each strategy.
+
+    Each day's value is the previous value, scaled by withdrawals and buys,
+    plus inflows, grown by the day's return on the invested weight:
+
+        V_t = (V_{t-1} * kept_t + inflow_t) * (1 + weight_t * return_t)
+
+    which unrolls into a cumulative product and a cumulative sum.
+
+    Args:
+        growth: Cumulative growth, shape (days,) or (holdings, days)
+        impact_idx: Index of the event impact start
+        specs: Sequence of StrategySpec
+        with_day_growth: Also return each day's growth factor 1 + weight_t * return_t
+
+    Returns:
+        Array of shape (strategies, days) or (holdings, strategies, days), and
+        with with_day_growth the day growth factors, broadcastable to that shape
+    """
+    growth = np.asarray(growth, dtype=np.float64)
+    lead_shape = growth.shape[:-1]
+    days = growth.shape[-1]
+    if days == 0:
+        values = np.empty(lead_shape + (len(specs), 0))
+        return (values, values) if with_day_growth else values
+    growth = growth.reshape(-1, days)
+
+    scheduled_inflows, kept = compile_schedules(specs, days, impact_idx)
+    price_triggered = any(spec.dips or spec.stop_loss for spec in specs)
+    weighted = any(spec.stop_loss or spec.rebalance for spec in specs)
+
+    if not weighted:
+        # Fully invested throughout: the compounded factor is the growth itself,
+        # scaled by the withdrawals kept so far
+        growth = growth / growth[:, :1]
+        kept_so_far = np.cumprod(kept, axis=-1)
+        compounded = kept_so_far[None] * growth[:, None, :]
+        previous_growth = np.concatenate((growth[:, :1], growth[:, :-1]), axis=-1)
+        if price_triggered:
+            running_peak = np.maximum.accumulate(growth, axis=-1)
+            inflows = np.repeat(scheduled_inflows[None], len(growth), axis=0)
+            _dip_inflows(inflows, specs, growth / running_peak - 1)
+            invested = inflows / (kept_so_far[None] * previous_growth[:, None, :])
+        else:
+            invested = (scheduled_inflows / kept_so_far)[None] / previous_growth[:, None, :]
+        values = compounded * (1 + np.cumsum(invested, axis=-1))
+        values = values.reshape(lead_shape + (len(specs), days))
+        if not with_day_growth:
+            return values
+        day_growth = (growth / previous_growth)[:, None, :]
+        return values, day_growth.reshape(lead_shape + (1, days))
+
+    returns = np.zeros_like(growth)
+    returns[:, 1:] = growth[:, 1:] / growth[:, :-1] - 1
+    running_peak = np.maximum.accumulate(growth, axis=-1)
+    drawdown = growth / running_peak - 1
+
+    inflows = np.repeat(scheduled_inflows[None], len(growth), axis=0)
+    _dip_inflows(inflows, specs, drawdown)
+
+    weights = np.ones((len(growth), len(specs), days))
+    _stop_loss_weights(weights, specs, growth, running_peak, drawdown)
+    _rebalance_weights(weights, specs, growth)
+
+    day_growth = 1 + weights * returns[:, None, :]
+    compounded = np.cumprod(kept[None] * day_growth, axis=-1)
+    values = compounded * (1 + np.cumsum(inflows * day_growth / compounded, axis=-1))
+    values = values.reshape(lead_shape + (len(specs), days))
+    if not with_day_growth:
+        return values
+    return values, day_growth.reshape(lead_shape + (len(specs), days))